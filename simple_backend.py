@@ -1,108 +1,2328 @@
-from flask import Flask, jsonify, request, g
+from flask import Flask, jsonify, request, g, has_app_context
 import sqlite3
 import os
-from datetime import datetime
+import socket
+import signal
+import argparse
+import atexit
+import bisect
+import cProfile
+import glob
+import heapq
+import hmac
+import json
+import logging
+import math
+import pstats
+import queue
+import random
+import sys
+import uuid
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: no fork, no flock
+    fcntl = None
 
 app = Flask(__name__)
 DATABASE = 'todos.db'
+WRITE_LOCK = DATABASE + '.lock'
+SNAPSHOT = DATABASE + '.snapshot'
+BUSY_TIMEOUT_MS = 5000
+
+# Durability profiles (--durability), applied as PRAGMAs to every connection
+DURABILITY_PROFILES = {
+    # one transaction and one WAL fsync per write: nothing acknowledged is lost
+    'strict': {'synchronous': 'FULL'},
+    # one transaction per write, fsync only around checkpoints: survives a
+    # killed process, but a power cut can drop recent commits
+    'normal': {'synchronous': 'NORMAL'},
+    # group commit (WriteBatch): writes are acknowledged before their batch
+    # commits, so a crash or power cut loses at most ASYNC_FLUSH_SECONDS
+    'async': {'synchronous': 'FULL'},
+}
+DEFAULT_DURABILITY = 'strict'
+ASYNC_FLUSH_SECONDS = 0.2
+ASYNC_BATCH_SIZE = 1000
+# JSON field names for the rich fields match backend/server.js and the frontend
+TODO_COLUMNS = 'id, title, completed, created_at, priority, due_date AS dueDate, position'
+PRIORITIES = ('high', 'medium', 'low')
+
+# Background maintenance (soft-delete purge, vacuum, checkpoint)
+MAINTENANCE_INTERVAL = 60
+PURGE_AFTER_SECONDS = 3600
+PURGE_BATCH_SIZE = 500
+VACUUM_PAGES = 200
+MAINTENANCE_BUSY_TIMEOUT_MS = 100
+
+# Admission control: per-client token bucket plus global in-flight caps
+RATE_LIMIT_PER_SECOND = 20.0
+RATE_LIMIT_BURST = 40
+RATE_LIMIT_MAX_CLIENTS = 10000
+MAX_CONCURRENT_READS = 32
+MAX_CONCURRENT_WRITES = 4
+ADMISSION_WAIT_SECONDS = 0.05
+OVERLOAD_RETRY_AFTER = 1
+
+# Responses replayed for a retried Idempotency-Key
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+
+# Due-date reminders
+REMINDER_MAX_SLEEP = 30
+REMINDER_BATCH_SIZE = 500
+DUE_EVENT_TTL_SECONDS = 7 * 24 * 3600
+
+# Manual ordering: lexicographic rank keys over base-36 digits
+RANK_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+RANK_REBALANCE_LENGTH = 24
+
+# In-memory engine (--store memory)
+MEMORY_SNAPSHOT = DATABASE + '.memory.json'
+MEMORY_SNAPSHOT_SECONDS = 5
+MEMORY_MAX_DUE_EVENTS = 10000
+MEMORY_MAX_IDEMPOTENCY_KEYS = 10000
+
+# Structured access log (enabled with --access-log)
+ACCESS_LOG_QUEUE_SIZE = 10000
+ACCESS_LOG_BATCH_SIZE = 200
+ACCESS_LOG_FLUSH_SECONDS = 1.0
+
+# Sampling profiler, switched on at runtime through /api/admin/profiling
+PROFILE_STATE = DATABASE + '.profiling'
+PROFILE_STATE_CHECK_SECONDS = 1.0
+PROFILE_BUFFER_SIZE = 50
+PROFILE_TREE_DEPTH = 12
+PROFILE_TREE_MIN_FRACTION = 0.01
+PROFILE_HOTSPOTS = 10
+# Operator endpoints skip admission control and profiling, so they keep
+# answering during the incident they are being used to investigate
+OPERATOR_ENDPOINTS = frozenset(('get_metrics', 'profiling_settings', 'get_profiles'))
+
+class AccessLogSink:
+    """JSON-lines access log written by a background thread.
+
+    Requests only put a dict on a bounded queue; if the queue is full the
+    entry is dropped and counted rather than blocking. The writer thread
+    drains up to ACCESS_LOG_BATCH_SIZE entries per write. Successful
+    requests are sampled at `sample_rate`; errors are always logged.
+    """
+
+    def __init__(self, stream, sample_rate=1.0):
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.queue = queue.Queue(ACCESS_LOG_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def emit(self, entry):
+        if entry['status'] < 500 and random.random() >= self.sample_rate:
+            return
+        # Threads do not survive fork(), so each worker starts its own writer
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.queue = queue.Queue(ACCESS_LOG_QUEUE_SIZE)
+                    threading.Thread(target=self.run, args=(self.queue,),
+                                     name='todo-access-log', daemon=True).start()
+                    self.pid = os.getpid()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            count('access_log_dropped')
+
+    def run(self, entries):
+        while True:
+            batch = [entries.get()]
+            deadline = time.monotonic() + ACCESS_LOG_FLUSH_SECONDS
+            while len(batch) < ACCESS_LOG_BATCH_SIZE:
+                try:
+                    batch.append(entries.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self.stream.write(''.join(json.dumps(e) + '\n' for e in batch))
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass
+
+class RequestProfiler:
+    """Samples requests with cProfile while switched on from the admin API.
+
+    The switch and sample rate live in PROFILE_STATE so every pre-forked
+    worker picks up a change within PROFILE_STATE_CHECK_SECONDS; while off,
+    a request costs a clock read and a comparison. cProfile only hooks the
+    thread that enables it, and only one request per process is profiled at
+    a time. Finished reports go into a ring buffer of PROFILE_BUFFER_SIZE,
+    mirrored to a JSON-lines file per worker so any worker can answer with
+    all of them (see collect()).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.checked_at = 0.0
+        self.mtime = None
+        self.active = threading.Lock()
+        self.reports = deque(maxlen=PROFILE_BUFFER_SIZE)
+        self.next_id = 1
+        self.saved_pid = None
+        self.saved_lines = 0
+
+    def refresh(self):
+        now = time.monotonic()
+        if now - self.checked_at < PROFILE_STATE_CHECK_SECONDS:
+            return
+        self.checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self.mtime:
+                return
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            self.enabled, self.mtime = False, None
+            return
+        except (OSError, ValueError):
+            return
+        self.mtime = mtime
+        self.enabled = bool(state.get('enabled'))
+        self.sample_rate = float(state.get('sample_rate', 0.0))
+
+    def configure(self, enabled, sample_rate):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'enabled': enabled, 'sample_rate': sample_rate}, f)
+        os.replace(tmp, self.path)
+        self.enabled, self.sample_rate = enabled, sample_rate
+        # Re-read on the next request, so this process also learns the new mtime
+        self.checked_at = 0.0
+
+    def reset(self):
+        """Start switched off; a toggle, or a report, never outlives the server."""
+        for path in [self.path] + glob.glob(glob.escape(self.path) + '.reports.*'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.enabled, self.mtime = False, None
+
+    def start(self):
+        """Return a running profile if this request is sampled, else None."""
+        self.refresh()
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        if not self.active.acquire(blocking=False):
+            count('profiles_skipped')
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, report, view=None):
+        """Stop `profile` and file `report` with its call tree under `view`."""
+        profile.disable()
+        try:
+            stats = pstats.Stats(profile).stats
+            report['id'] = self.next_id
+            report['tree'] = call_tree(stats, view) if view is not None else None
+            report['hotspots'] = hotspots(stats)
+            self.next_id += 1
+            self.reports.append(report)
+            self.save(report)
+            count('profiles_taken')
+        finally:
+            self.active.release()
+
+    def save(self, report):
+        """Append `report` to this worker's file; the caller holds self.active.
+
+        The file is rewritten from the ring buffer once it has grown to twice
+        PROFILE_BUFFER_SIZE lines, which bounds it at an amortised O(1) cost.
+        """
+        path = '%s.reports.%d' % (self.path, os.getpid())
+        if self.saved_pid != os.getpid():
+            self.saved_pid, self.saved_lines = os.getpid(), 0
+        try:
+            if self.saved_lines >= 2 * PROFILE_BUFFER_SIZE:
+                with open(path + '.tmp', 'w') as f:
+                    f.writelines(json.dumps(r) + '\n' for r in self.reports)
+                os.replace(path + '.tmp', path)
+                self.saved_lines = len(self.reports)
+            else:
+                with open(path, 'a') as f:
+                    f.write(json.dumps(report) + '\n')
+                self.saved_lines += 1
+        except OSError:
+            pass  # the report is still in this worker's buffer
+
+    def collect(self):
+        """Every worker's last PROFILE_BUFFER_SIZE reports, newest first."""
+        reports = []
+        for path in glob.glob(glob.escape(self.path) + '.reports.*'):
+            if path.endswith('.tmp'):
+                continue
+            try:
+                with open(path) as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in lines[-PROFILE_BUFFER_SIZE:]:
+                try:
+                    reports.append(json.loads(line))
+                except ValueError:
+                    pass  # a line still being appended
+        reports.sort(key=lambda r: (r['ts'], r['id']), reverse=True)
+        return reports
+
+    def abandon(self, profile):
+        profile.disable()
+        self.active.release()
+
+def function_key(func):
+    code = getattr(func, '__code__', None)
+    return code and (code.co_filename, code.co_firstlineno, code.co_name)
+
+def function_label(key):
+    filename, line, name = key
+    if filename == '~':  # C function or method, minus any "at 0x..." address
+        return name.split(' at 0x')[0].rstrip('>') + '>' if ' at 0x' in name else name
+    return '%s:%d(%s)' % (os.path.basename(filename), line, name)
+
+def call_tree(stats, view):
+    """Nested cumulative timings below the view function.
+
+    pstats only keeps caller->callee edges, so a node's subtree is the
+    callee's totals across all its callers. Branches under
+    PROFILE_TREE_MIN_FRACTION of the handler's time are pruned. Calls into
+    the SQL timing wrappers are shown as leaves named after the sqlite3
+    method; the per-statement breakdown is in the report's `sql` list.
+    """
+    root = function_key(view)
+    if root not in stats:
+        return None
+    children = {}
+    for callee, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((callee, edge))
+    floor = stats[root][3] * PROFILE_TREE_MIN_FRACTION
+    leaves = {function_key(f): 'sqlite3.%s.%s' % (base.__name__, name)
+              for cls, base in ((TimedConnection, sqlite3.Connection), (TimedCursor, sqlite3.Cursor))
+              for name, f in vars(cls).items() if function_key(f)}
+
+    def node(key, calls, own, total, path):
+        entry = {
+            'function': leaves.get(key) or function_label(key),
+            'calls': calls,
+            'ms': round(total * 1000, 3),
+            'self_ms': round(own * 1000, 3),
+        }
+        if key not in leaves and len(path) < PROFILE_TREE_DEPTH:
+            edges = sorted(children.get(key, ()), key=lambda c: -c[1][3])
+            entry['children'] = [
+                node(callee, edge[0], edge[2], edge[3], path | {callee})
+                for callee, edge in edges
+                if callee not in path and edge[3] >= floor
+            ]
+        return entry
+
+    _, calls, own, total, _ = stats[root]
+    return node(root, calls, own, total, {root})
+
+def hotspots(stats):
+    """The functions with the most time spent in their own code."""
+    top = heapq.nlargest(PROFILE_HOTSPOTS, stats.items(), key=lambda item: item[1][2])
+    return [
+        {'function': function_label(key), 'calls': nc,
+         'self_ms': round(tt * 1000, 3), 'ms': round(ct * 1000, 3)}
+        for key, (_, nc, tt, ct, _) in top
+    ]
+
+class TimedConnection(sqlite3.Connection):
+    """Connection for a profiled request: every statement goes through TimedCursor."""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TimedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+class TimedCursor(sqlite3.Cursor):
+    """Adds each statement's time, including fetching its rows, to the profiled request."""
+
+    def execute(self, sql, parameters=()):
+        return self.timed(super().execute, self.begin(sql), parameters)
+
+    def executemany(self, sql, parameters):
+        return self.timed(super().executemany, self.begin(sql), parameters)
+
+    def fetchone(self):
+        return self.timed(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self.timed(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self.timed(super().fetchall)
+
+    def __next__(self):
+        return self.timed(super().__next__)
+
+    def begin(self, sql):
+        self.timing = {'sql': ' '.join(sql.split()), 'ms': 0.0}
+        g._profile_sql.append(self.timing)
+        return sql
+
+    def timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.timing['ms'] += (time.perf_counter() - start) * 1000
+
+class RateLimiter:
+    """Token bucket per client, with the least recently seen clients evicted."""
+
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, client):
+        """Take one token; return 0 if allowed, else seconds until one is free."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            self.buckets[client] = (tokens, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        return wait
+
+rate_limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_MAX_CLIENTS)
+profiler = RequestProfiler(PROFILE_STATE)
+read_slots = threading.BoundedSemaphore(MAX_CONCURRENT_READS)
+write_slots = threading.BoundedSemaphore(MAX_CONCURRENT_WRITES)
+metrics = Counter()
+metrics_lock = threading.Lock()
+# Set when a due date changes, so the reminder thread re-reads the next deadline
+reminder_wakeup = threading.Event()
+
+def count(name, n=1):
+    with metrics_lock:
+        metrics[name] += n
+
+def overloaded(status, message, retry_after):
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def count_sql(statement):
+    g._sql_count = g.get('_sql_count', 0) + 1
+
+@app.before_request
+def start_request():
+    # Registered first, so 429/503 answers from admit_request are timed too
+    g._started = time.perf_counter()
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+@app.after_request
+def log_request(response):
+    response.headers['X-Request-ID'] = g.request_id
+    sink = app.config.get('ACCESS_LOG')
+    if sink is not None:
+        sink.emit({
+            'ts': round(time.time(), 3),
+            'request_id': g.request_id,
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'path': request.path,
+            'status': response.status_code,
+            'latency_ms': round((time.perf_counter() - g._started) * 1000, 3),
+            'sql_count': g.get('_sql_count', 0),
+            'pid': os.getpid(),
+        })
+    return response
+
+@app.before_request
+def admit_request():
+    if request.endpoint in OPERATOR_ENDPOINTS:
+        return None
+    
+    wait = rate_limiter.acquire(request.remote_addr)
+    if wait:
+        count('rate_limited')
+        return overloaded(429, 'Too many requests', wait)
+    
+    # Shed load quickly instead of letting requests queue on SQLite's lock
+    is_write = request.method not in ('GET', 'HEAD', 'OPTIONS')
+    slots = write_slots if is_write else read_slots
+    if not slots.acquire(timeout=ADMISSION_WAIT_SECONDS):
+        count('shed_writes' if is_write else 'shed_reads')
+        return overloaded(503, 'Server busy', OVERLOAD_RETRY_AFTER)
+    g._admission_slots = slots
+    count('admitted')
+
+@app.teardown_request
+def release_admission(exception):
+    slots = g.pop('_admission_slots', None)
+    if slots is not None:
+        slots.release()
+
+@app.before_request
+def start_profile():
+    # Registered after admit_request, so shed requests are never profiled
+    if request.endpoint in OPERATOR_ENDPOINTS:
+        return None
+    profile = profiler.start()
+    if profile is not None:
+        g._profile = profile
+        g._profile_sql = []
+
+@app.after_request
+def finish_profile(response):
+    profile = g.pop('_profile', None)
+    if profile is not None:
+        sql = [dict(t, ms=round(t['ms'], 3)) for t in g._profile_sql]
+        profiler.finish(profile, {
+            'ts': round(time.time(), 3),
+            'request_id': g.request_id,
+            'pid': os.getpid(),
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'path': request.path,
+            'status': response.status_code,
+            'latency_ms': round((time.perf_counter() - g._started) * 1000, 3),
+            'sql_ms': round(sum(t['ms'] for t in sql), 3),
+            'sql': sql,
+        }, app.view_functions.get(request.endpoint))
+    return response
+
+@app.teardown_request
+def abandon_profile(exception):
+    # Only left over if the request failed before finish_profile ran
+    profile = g.pop('_profile', None)
+    if profile is not None:
+        profiler.abandon(profile)
+
+def connect_db(busy_timeout_ms=BUSY_TIMEOUT_MS, factory=sqlite3.Connection,
+               check_same_thread=True):
+    db = sqlite3.connect(DATABASE, isolation_level=None, factory=factory,
+                         check_same_thread=check_same_thread)
+    db.row_factory = sqlite3.Row
+    db.execute('PRAGMA busy_timeout = %d' % busy_timeout_ms)
+    profile = app.config.get('DURABILITY', DEFAULT_DURABILITY)
+    for pragma, value in DURABILITY_PROFILES[profile].items():
+        db.execute('PRAGMA %s = %s' % (pragma, value))
+    db.execute('PRAGMA foreign_keys = ON')
+    return db
 
 def get_db():
     db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+    # Never reuse a connection that was opened before a fork
+    if db is None or getattr(g, '_database_pid', None) != os.getpid():
+        # Profiled requests time their statements; others pay nothing for it
+        factory = TimedConnection if g.get('_profile') is not None else sqlite3.Connection
+        db = g._database = connect_db(factory=factory)
+        g._database_pid = os.getpid()
+        if app.config.get('ACCESS_LOG') is not None:
+            db.set_trace_callback(count_sql)
     return db
 
+def get_read_db():
+    """Connection for read-only routes.
+
+    With snapshot reads on (app.config['SNAPSHOT_STALENESS'] seconds), this
+    is the periodically refreshed snapshot file, unless the snapshot is older
+    than that bound or older than the client's X-Read-After timestamp (sent
+    back as X-Write-Timestamp by every write), in which case the primary is
+    used so the client reads its own writes.
+    """
+    staleness = app.config.get('SNAPSHOT_STALENESS')
+    if not staleness:
+        return get_db()
+    db = getattr(g, '_read_database', None)
+    if db is not None:
+        return db
+    try:
+        taken_at = os.stat(SNAPSHOT).st_mtime
+    except OSError:
+        return get_db()
+    needed = request.headers.get('X-Read-After', 0, type=float)
+    if time.time() - taken_at > staleness or taken_at < needed:
+        count('snapshot_misses')
+        return get_db()
+    # The file is only ever replaced, never modified, so it can be opened immutable
+    db = g._read_database = sqlite3.connect(
+        'file:%s?mode=ro&immutable=1' % SNAPSHOT, uri=True,
+        factory=TimedConnection if g.get('_profile') is not None else sqlite3.Connection
+    )
+    db.row_factory = sqlite3.Row
+    if app.config.get('ACCESS_LOG') is not None:
+        db.set_trace_callback(count_sql)
+    count('snapshot_reads')
+    return db
+
+@app.after_request
+def stamp_write(response):
+    if (app.config.get('SNAPSHOT_STALENESS') and response.status_code < 400
+            and request.method not in ('GET', 'HEAD', 'OPTIONS')):
+        response.headers['X-Write-Timestamp'] = '%.6f' % time.time()
+    return response
+
 @app.teardown_appcontext
 def close_connection(exception):
     db = getattr(g, '_database', None)
-    if db is not None:
+    if db is not None and getattr(g, '_database_pid', None) == os.getpid():
         db.close()
+    read_db = g.pop('_read_database', None)
+    if read_db is not None:
+        read_db.close()
+
+@contextmanager
+def write_transaction(db=None):
+    """Run a write as one IMMEDIATE transaction.
+
+    In multi-worker mode writers first queue on an flock() so only one
+    worker at a time contends for SQLite's write lock; readers are never
+    blocked thanks to WAL.
+    """
+    if db is None:
+        db = get_db()
+    lock_file = lock_writers()
+    try:
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db.cursor()
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+    finally:
+        unlock_writers(lock_file)
+
+def lock_writers():
+    """Take the cross-worker write flock (multi-worker mode only)."""
+    if fcntl is None or app.config.get('WORKERS', 1) <= 1:
+        return None
+    lock_file = open(WRITE_LOCK, 'a')
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+def unlock_writers(lock_file):
+    if lock_file is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+class WriteBatch:
+    """Group commit for the async durability profile (single process only).
+
+    Request writes run as savepoints inside one open transaction and are
+    acknowledged as soon as their savepoint is released. The transaction
+    commits, with a single fsync, once it is ASYNC_FLUSH_SECONDS old or
+    holds ASYNC_BATCH_SIZE writes: by the next write to arrive, or by a
+    background thread once writes stop. A crash therefore loses at most the
+    last ASYNC_FLUSH_SECONDS of acknowledged writes.
+
+    Until the batch commits its writes exist only on the batch connection,
+    so reads go through it too (see reader()). Another process would not
+    see them, which is why async refuses --workers.
+    """
+
+    def __init__(self):
+        self.setup_lock = threading.Lock()
+        self.pid = None
+
+    def start(self):
+        # Threads and connections do not survive fork(), so each process sets up its own
+        if self.pid == os.getpid():
+            return
+        with self.setup_lock:
+            if self.pid == os.getpid():
+                return
+            # write_lock serialises writers; lock guards the connection
+            # once a batch is open, and is never held while waiting for SQLite
+            self.write_lock = threading.Lock()
+            self.lock = threading.Lock()
+            self.opened = threading.Event()
+            self.db = connect_db(check_same_thread=False)
+            self.started_at = None
+            self.pending = 0
+            threading.Thread(target=self.run, name='todo-group-commit', daemon=True).start()
+            atexit.register(self.flush)
+            self.pid = os.getpid()
+
+    @contextmanager
+    def transaction(self):
+        self.start()
+        with self.write_lock:
+            if self.started_at is None:
+                self.begin()
+            with self.lock, self.request_cursor() as cursor:
+                cursor.execute('SAVEPOINT request')
+                try:
+                    yield cursor
+                except BaseException:
+                    cursor.execute('ROLLBACK TO request')
+                    cursor.execute('RELEASE request')
+                    raise
+                cursor.execute('RELEASE request')
+                self.pending += 1
+                # Commit from the request path too, so a busy process can't starve run()
+                if (self.pending >= ASYNC_BATCH_SIZE
+                        or time.monotonic() - self.started_at >= ASYNC_FLUSH_SECONDS):
+                    self.commit()
+
+    @contextmanager
+    def reader(self):
+        """Yield a cursor that sees the open batch, or None if there isn't one."""
+        if self.pid == os.getpid():
+            with self.lock:
+                if self.started_at is not None:
+                    with self.request_cursor() as cursor:
+                        yield cursor
+                    return
+        yield None
+
+    @contextmanager
+    def request_cursor(self):
+        """A batch cursor counted and timed like get_db()'s; the caller holds self.lock."""
+        if not has_app_context():
+            yield self.db.cursor()
+            return
+        if app.config.get('ACCESS_LOG') is not None:
+            self.db.set_trace_callback(count_sql)
+        try:
+            yield self.db.cursor(TimedCursor) if g.get('_profile') is not None else self.db.cursor()
+        finally:
+            self.db.set_trace_callback(None)
+
+    def begin(self):
+        """Open a batch; the caller holds self.write_lock, so readers aren't blocked meanwhile."""
+        self.db.execute('BEGIN IMMEDIATE')
+        with self.lock:
+            self.started_at = time.monotonic()
+        self.opened.set()
+
+    def commit(self):
+        """Commit the open batch; the caller holds self.lock."""
+        try:
+            self.db.execute('COMMIT')
+        except sqlite3.Error:
+            app.logger.exception('group commit of %d writes failed', self.pending)
+            try:
+                self.db.rollback()
+            except sqlite3.Error:
+                pass
+            raise
+        finally:
+            self.started_at = None
+            self.pending = 0
+            self.opened.clear()
+
+    def flush(self, started_at=None):
+        """Commit the open batch, if any (and if it is the one opened at `started_at`)."""
+        if self.pid != os.getpid():
+            return
+        with self.write_lock, self.lock:
+            if self.started_at is not None and started_at in (None, self.started_at):
+                self.commit()
+
+    def run(self):
+        while True:
+            self.opened.wait()
+            with self.lock:
+                started_at = self.started_at
+            if started_at is None:
+                continue
+            time.sleep(max(started_at + ASYNC_FLUSH_SECONDS - time.monotonic(), 0))
+            try:
+                self.flush(started_at)
+            except sqlite3.Error:
+                pass  # already logged by commit()
+
+write_batch = WriteBatch()
+
+STATS_SCHEMA = (
+    '''
+        CREATE TABLE todo_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0
+        )
+    ''',
+    '''
+        CREATE TABLE todo_daily_stats (
+            day TEXT PRIMARY KEY,
+            created INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''',
+)
+
+# Counters only cover live (not soft-deleted) todos. The triggers are
+# recreated on every start so older databases pick up changes to them.
+STATS_TRIGGERS = (
+    '''
+        CREATE TRIGGER todos_stats_insert AFTER INSERT ON todos BEGIN
+            UPDATE todo_stats
+            SET total = total + 1,
+                completed = completed + (COALESCE(NEW.completed, 0) != 0)
+            WHERE id = 1;
+            INSERT INTO todo_daily_stats (day, created) VALUES (date(NEW.created_at), 1)
+            ON CONFLICT(day) DO UPDATE SET created = created + 1;
+            INSERT INTO todo_daily_stats (day, completed)
+            SELECT date('now'), 1 WHERE COALESCE(NEW.completed, 0) != 0
+            ON CONFLICT(day) DO UPDATE SET completed = completed + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER todos_stats_update AFTER UPDATE OF completed ON todos
+        WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NULL BEGIN
+            UPDATE todo_stats
+            SET completed = completed
+                + (COALESCE(NEW.completed, 0) != 0)
+                - (COALESCE(OLD.completed, 0) != 0)
+            WHERE id = 1;
+            INSERT INTO todo_daily_stats (day, completed)
+            SELECT date('now'), 1
+            WHERE COALESCE(NEW.completed, 0) != 0 AND COALESCE(OLD.completed, 0) = 0
+            ON CONFLICT(day) DO UPDATE SET completed = completed + 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER todos_stats_soft_delete AFTER UPDATE OF deleted_at ON todos
+        WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL BEGIN
+            UPDATE todo_stats
+            SET total = total - 1,
+                completed = completed - (COALESCE(OLD.completed, 0) != 0)
+            WHERE id = 1;
+        END
+    ''',
+    '''
+        CREATE TRIGGER todos_stats_delete AFTER DELETE ON todos
+        WHEN OLD.deleted_at IS NULL BEGIN
+            UPDATE todo_stats
+            SET total = total - 1,
+                completed = completed - (COALESCE(OLD.completed, 0) != 0)
+            WHERE id = 1;
+        END
+    ''',
+)
+
+def table_exists(cursor, name):
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    )
+    return cursor.fetchone() is not None
+
+def add_column(cursor, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there."""
+    cursor.execute('PRAGMA table_info(%s)' % table)
+    if column not in [row['name'] for row in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE %s ADD COLUMN %s %s' % (table, column, definition))
+
+def canonicalize_due_dates(cursor):
+    """Rewrite due dates stored before they were validated in canonical UTC form.
+
+    Text that doesn't parse is left alone but marked as reminded, so the
+    reminder thread never waits on it.
+    """
+    cursor.execute(
+        "SELECT id, due_date FROM todos WHERE due_date IS NOT NULL "
+        "AND due_date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' "
+        "AND due_date NOT GLOB "
+        "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]T[0-9][0-9]:[0-9][0-9]:[0-9][0-9]'"
+    )
+    for row in cursor.fetchall():
+        due_date = canonical_due_date(row['due_date'])
+        if due_date is None:
+            cursor.execute(
+                'UPDATE todos SET reminded_at = COALESCE(reminded_at, CURRENT_TIMESTAMP) '
+                'WHERE id = ?', (row['id'],)
+            )
+        else:
+            cursor.execute('UPDATE todos SET due_date = ? WHERE id = ?', (due_date, row['id']))
 
 def init_db():
     with app.app_context():
         db = get_db()
-        cursor = db.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS todos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                completed BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        # incremental_vacuum needs auto_vacuum=INCREMENTAL; an existing
+        # database only switches over after a one-off full VACUUM
+        if db.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            db.execute('VACUUM')
+        # WAL is persistent, so every worker sees it once it is set here
+        db.execute('PRAGMA journal_mode = WAL')
+        with write_transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS todos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    completed BOOLEAN DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            add_column(cursor, 'todos', 'deleted_at', 'TIMESTAMP')
+            add_column(cursor, 'todos', 'priority', 'TEXT')
+            add_column(cursor, 'todos', 'due_date', 'TEXT')
+            add_column(cursor, 'todos', 'reminded_at', 'TIMESTAMP')
+            add_column(cursor, 'todos', 'position', 'TEXT')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_todos_position '
+                'ON todos (position) WHERE deleted_at IS NULL'
+            )
+            cursor.execute('SELECT 1 FROM todos WHERE position IS NULL LIMIT 1')
+            if cursor.fetchone():
+                rebalance_positions(cursor)
+            # Partial indexes on the bulk predicates: completed alone has two
+            # values and counts tombstones, so the planner drops it after ANALYZE
+            cursor.execute('DROP INDEX IF EXISTS idx_todos_completed')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_todos_active ON todos (id) '
+                'WHERE deleted_at IS NULL AND COALESCE(completed, 0) = 0'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_todos_done ON todos (id) '
+                'WHERE deleted_at IS NULL AND COALESCE(completed, 0) != 0'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_todos_live_created '
+                'ON todos (created_at) WHERE deleted_at IS NULL'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_todos_priority '
+                'ON todos (priority, created_at) WHERE deleted_at IS NULL'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_todos_due_date '
+                'ON todos (due_date) WHERE deleted_at IS NULL AND due_date IS NOT NULL'
+            )
+            # Deadlines not yet reminded about; the head of this index is the next one
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_todos_pending_due ON todos (due_date) '
+                'WHERE deleted_at IS NULL AND due_date IS NOT NULL AND reminded_at IS NULL'
+            )
+            canonicalize_due_dates(cursor)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS due_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    todo_id INTEGER NOT NULL,
+                    due_date TEXT NOT NULL,
+                    fired_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Tags are normalised into a join table instead of a JSON column
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS tags (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS todo_tags (
+                    tag_id INTEGER NOT NULL REFERENCES tags (id),
+                    todo_id INTEGER NOT NULL REFERENCES todos (id) ON DELETE CASCADE,
+                    PRIMARY KEY (tag_id, todo_id)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_todo_tags_todo ON todo_tags (todo_id)'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_todos_deleted '
+                'ON todos (deleted_at) WHERE deleted_at IS NOT NULL'
+            )
+            if not table_exists(cursor, 'todo_stats'):
+                for statement in STATS_SCHEMA:
+                    cursor.execute(statement)
+                # Seed the counters from whatever is already in the table
+                cursor.execute('''
+                    INSERT INTO todo_stats (id, total, completed)
+                    SELECT 1, COUNT(*), COALESCE(SUM(COALESCE(completed, 0) != 0), 0)
+                    FROM todos WHERE deleted_at IS NULL
+                ''')
+                cursor.execute('''
+                    INSERT INTO todo_daily_stats (day, created)
+                    SELECT date(created_at), COUNT(*) FROM todos GROUP BY date(created_at)
+                ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    key TEXT PRIMARY KEY,
+                    request TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    body TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_idempotency_created '
+                'ON idempotency_keys (created_at)'
+            )
+            for name in ('insert', 'update', 'soft_delete', 'delete'):
+                cursor.execute('DROP TRIGGER IF EXISTS todos_stats_%s' % name)
+            for statement in STATS_TRIGGERS:
+                cursor.execute(statement)
+
+def step_rank(key, delta):
+    """Add `delta` to `key` read as a base-36 integer of the same width.
+
+    Returns None if that would overflow or produce the all-zero key, which
+    nothing could ever be placed before.
+    """
+    base = len(RANK_DIGITS)
+    value = 0
+    for ch in key:
+        value = value * base + RANK_DIGITS.index(ch)
+    value += delta
+    if value <= 0 or value >= base ** len(key):
+        return None
+    digits = ''
+    for _ in key:
+        value, digit = divmod(value, base)
+        digits = RANK_DIGITS[digit] + digits
+    return digits
+
+def rank_between(low, high):
+    """Return a rank key sorting strictly between `low` and `high`.
+
+    Either bound may be None for "no bound". Keys are compared as plain
+    strings, so a move only ever rewrites the moved row. At an open end the
+    neighbour is stepped by one rather than halved, and when that runs out
+    the key doubles in width, so adding to the top or bottom of the list
+    grows keys only logarithmically.
+    """
+    if low is None and high is not None:
+        return step_rank(high, -1) or '0' * len(high) + RANK_DIGITS[-1] * len(high)
+    if high is None and low is not None:
+        return step_rank(low, 1) or low + '0' * (len(low) - 1) + RANK_DIGITS[1]
+    
+    base = len(RANK_DIGITS)
+    low = low or ''
+    key = ''
+    n = 0
+    while True:
+        lo = RANK_DIGITS.index(low[n]) if n < len(low) else 0
+        hi = RANK_DIGITS.index(high[n]) if high is not None and n < len(high) else base
+        if lo == hi:
+            key += RANK_DIGITS[lo]
+            n += 1
+            continue
+        mid = (lo + hi) // 2
+        if mid > lo:
+            return key + RANK_DIGITS[mid]
+        # Adjacent digits: keep low's digit and go one level deeper, unbounded above
+        key += RANK_DIGITS[lo]
+        low = low[n + 1:]
+        high = None
+        n = 0
+
+def evenly_spaced_ranks(count):
+    base = len(RANK_DIGITS)
+    # Leave at least base**2 free keys at either end for new todos
+    width = 2
+    while base ** width <= (count + 1) * base ** 2:
+        width += 1
+    step = base ** width // (count + 1)
+    ranks = []
+    for i in range(1, count + 1):
+        value, digits = i * step, ''
+        for _ in range(width):
+            value, digit = divmod(value, base)
+            digits = RANK_DIGITS[digit] + digits
+        ranks.append(digits)
+    return ranks
+
+def rebalance_positions(cursor):
+    """Rewrite every live position as short, evenly spaced keys, keeping order.
+
+    Todos without a position (from before manual ordering) go after the
+    rest, newest first.
+    """
+    cursor.execute(
+        'SELECT id FROM todos WHERE deleted_at IS NULL '
+        'ORDER BY position IS NULL, position, created_at DESC, id DESC'
+    )
+    ids = [row[0] for row in cursor.fetchall()]
+    cursor.executemany(
+        'UPDATE todos SET position = ? WHERE id = ?',
+        zip(evenly_spaced_ranks(len(ids)), ids)
+    )
+    return len(ids)
+
+class TodoNotFound(LookupError):
+    """Raised by store operations; the message becomes the 404 error text."""
+
+class TodoTransaction(ABC):
+    """Operations the route handlers run against a storage engine.
+
+    Todos are plain dicts with the JSON field names of the API. Operations
+    that modify data raise TodoNotFound before changing anything.
+    """
+
+    @abstractmethod
+    def list(self, tag=None, priority=None, due_before=None, sort=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create(self, data):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, todo_id, data):
+        """Change only the fields present in `data`; returns the todo."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, todo_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete_all(self):
+        """Mark every active todo complete; returns their ids."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear_completed(self):
+        """Delete every completed todo; returns their ids."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def move(self, todo_id, anchor_id, before):
+        """Place a todo after (or before) `anchor_id`; None means top (or bottom)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self, days):
+        raise NotImplementedError
+
+    @abstractmethod
+    def due_events(self, after, limit):
+        raise NotImplementedError
+
+    @abstractmethod
+    def idempotent_get(self, key, since):
+        """Return (request, status, body) stored for `key` after `since`, or None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def idempotent_put(self, key, request_line, status, body):
+        raise NotImplementedError
+
+class TodoStore(ABC):
+    """A storage engine: hands out read and write transactions."""
+
+    @abstractmethod
+    def read(self):
+        """Context manager yielding a TodoTransaction for read-only use."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self):
+        """Context manager yielding a TodoTransaction that commits atomically."""
+        raise NotImplementedError
+
+    def background_loops(self):
+        """(target, name) pairs run as threads by start_background_workers()."""
+        return []
+
+class SqliteTransaction(TodoTransaction):
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def list(self, tag=None, priority=None, due_before=None, sort=None):
+        where = ['deleted_at IS NULL']
+        params = []
+        if tag is not None:
+            where.append(
+                'id IN (SELECT todo_id FROM todo_tags '
+                'WHERE tag_id = (SELECT id FROM tags WHERE name = ?))'
+            )
+            params.append(tag)
+        if priority is not None:
+            where.append('priority = ?')
+            params.append(priority)
+        if due_before is not None:
+            # Implied by the comparison, but the planner only picks the
+            # partial idx_todos_due_date if its WHERE terms appear verbatim
+            where.append('due_date IS NOT NULL AND due_date < ?')
+            params.append(due_before)
+        order = 'position' if sort == 'position' else 'created_at DESC'
+        
+        self.cursor.execute(
+            'SELECT ' + TODO_COLUMNS + ' FROM todos '
+            'WHERE ' + ' AND '.join(where) + ' ORDER BY ' + order,
+            params
+        )
+        todos = [dict(row) for row in self.cursor.fetchall()]
+        return attach_tags(self.cursor, todos)
+
+    def create(self, data):
+        cursor = self.cursor
+        # New todos go to the top of the manual order
+        cursor.execute('SELECT MIN(position) FROM todos WHERE deleted_at IS NULL')
+        position = rank_between(None, cursor.fetchone()[0])
+        cursor.execute(
+            'INSERT INTO todos (title, completed, priority, due_date, position) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (data['title'], data.get('completed', False),
+             data.get('priority'), data.get('dueDate'), position)
+        )
+        todo_id = cursor.lastrowid
+        if data.get('tags'):
+            set_tags(cursor, todo_id, data['tags'])
+        return fetch_todo(cursor, todo_id)
+
+    def update(self, todo_id, data):
+        cursor = self.cursor
+        fields = {'title': 'title', 'completed': 'completed',
+                  'priority': 'priority', 'dueDate': 'due_date'}
+        updates = [(column, data[key]) for key, column in fields.items() if key in data]
+        if 'dueDate' in data:
+            # A new deadline gets a fresh reminder
+            updates.append(('reminded_at', None))
+        
+        # Update the todo, unless it does not exist or was deleted
+        if updates:
+            cursor.execute(
+                'UPDATE todos SET ' + ', '.join(c + ' = ?' for c, _ in updates) +
+                ' WHERE id = ? AND deleted_at IS NULL',
+                [v for _, v in updates] + [todo_id]
+            )
+            found = cursor.rowcount > 0
+        else:
+            cursor.execute(
+                'SELECT 1 FROM todos WHERE id = ? AND deleted_at IS NULL', (todo_id,)
             )
-        ''')
-        db.commit()
+            found = cursor.fetchone() is not None
+        if not found:
+            raise TodoNotFound('Todo not found')
+        if 'tags' in data:
+            set_tags(cursor, todo_id, data['tags'] or [])
+        return fetch_todo(cursor, todo_id)
+
+    def delete(self, todo_id):
+        # Soft delete; the maintenance worker purges the row later
+        self.cursor.execute(
+            'UPDATE todos SET deleted_at = CURRENT_TIMESTAMP '
+            'WHERE id = ? AND deleted_at IS NULL',
+            (todo_id,)
+        )
+        if self.cursor.rowcount == 0:
+            raise TodoNotFound('Todo not found')
+
+    def complete_all(self):
+        # One indexed UPDATE; RETURNING (SQLite 3.35+) avoids a second SELECT
+        self.cursor.execute(
+            'UPDATE todos SET completed = 1 '
+            'WHERE COALESCE(completed, 0) = 0 AND deleted_at IS NULL '
+            'RETURNING id'
+        )
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def clear_completed(self):
+        self.cursor.execute(
+            'UPDATE todos SET deleted_at = CURRENT_TIMESTAMP '
+            'WHERE COALESCE(completed, 0) != 0 AND deleted_at IS NULL RETURNING id'
+        )
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def move(self, todo_id, anchor_id, before):
+        cursor = self.cursor
+        live = 'deleted_at IS NULL AND id != ?'
+        cursor.execute(
+            'SELECT 1 FROM todos WHERE id = ? AND deleted_at IS NULL', (todo_id,)
+        )
+        if not cursor.fetchone():
+            raise TodoNotFound('Todo not found')
+        
+        anchor = None
+        if anchor_id is not None:
+            cursor.execute(
+                'SELECT position FROM todos WHERE id = ? AND ' + live,
+                (anchor_id, todo_id)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise TodoNotFound('Anchor todo not found')
+            anchor = row[0]
+        
+        # The anchor's neighbour on the other side is one index probe away
+        if not before:
+            low = anchor
+            if anchor is None:
+                cursor.execute('SELECT MIN(position) FROM todos WHERE ' + live, (todo_id,))
+            else:
+                cursor.execute(
+                    'SELECT MIN(position) FROM todos WHERE position > ? AND ' + live,
+                    (anchor, todo_id)
+                )
+            high = cursor.fetchone()[0]
+        else:
+            high = anchor
+            if anchor is None:
+                cursor.execute('SELECT MAX(position) FROM todos WHERE ' + live, (todo_id,))
+            else:
+                cursor.execute(
+                    'SELECT MAX(position) FROM todos WHERE position < ? AND ' + live,
+                    (anchor, todo_id)
+                )
+            low = cursor.fetchone()[0]
+        
+        cursor.execute(
+            'UPDATE todos SET position = ? WHERE id = ?',
+            (rank_between(low, high), todo_id)
+        )
+        return fetch_todo(cursor, todo_id)
+
+    def stats(self, days):
+        """Counts and per-day histograms, read from trigger-maintained tables."""
+        cursor = self.cursor
+        cursor.execute('SELECT total, completed FROM todo_stats WHERE id = 1')
+        totals = cursor.fetchone()
+        cursor.execute(
+            'SELECT day, created, completed FROM todo_daily_stats '
+            'WHERE day >= date(\'now\', ?) ORDER BY day',
+            ('-%d days' % max(days - 1, 0),)
+        )
+        history = cursor.fetchall()
+        return {
+            'total': totals['total'],
+            'completed': totals['completed'],
+            'active': totals['total'] - totals['completed'],
+            'created_per_day': {row['day']: row['created'] for row in history if row['created']},
+            'completed_per_day': {row['day']: row['completed'] for row in history if row['completed']},
+        }
+
+    def due_events(self, after, limit):
+        self.cursor.execute(
+            'SELECT id, todo_id, due_date AS dueDate, fired_at FROM due_events '
+            'WHERE id > ? ORDER BY id LIMIT ?',
+            (after, limit)
+        )
+        return [dict(row) for row in self.cursor.fetchall()]
+
+    def idempotent_get(self, key, since):
+        self.cursor.execute(
+            'SELECT request, status, body FROM idempotency_keys '
+            'WHERE key = ? AND created_at > ?',
+            (key, since)
+        )
+        row = self.cursor.fetchone()
+        return tuple(row) if row else None
+
+    def idempotent_put(self, key, request_line, status, body):
+        self.cursor.execute(
+            'INSERT OR REPLACE INTO idempotency_keys '
+            '(key, request, status, body, created_at) VALUES (?, ?, ?, ?, ?)',
+            (key, request_line, status, body, time.time())
+        )
+
+class SqliteStore(TodoStore):
+    """The default engine: todos.db through get_db()/get_read_db()."""
+
+    @contextmanager
+    def read(self):
+        if app.config.get('DURABILITY') != 'async':
+            yield SqliteTransaction(get_read_db().cursor())
+            return
+        # Acknowledged writes in an uncommitted batch are only visible there
+        with write_batch.reader() as cursor:
+            yield SqliteTransaction(cursor or get_read_db().cursor())
+
+    @contextmanager
+    def write(self):
+        if app.config.get('DURABILITY') == 'async':
+            with write_batch.transaction() as cursor:
+                yield SqliteTransaction(cursor)
+            return
+        with write_transaction() as cursor:
+            yield SqliteTransaction(cursor)
+
+    def background_loops(self):
+        loops = [(maintenance_loop, 'todo-maintenance'), (reminder_loop, 'todo-reminders')]
+        if app.config.get('SNAPSHOT_STALENESS'):
+            loops.append((snapshot_loop, 'todo-snapshot'))
+        return loops
+
+class TodoRecord:
+    __slots__ = ('id', 'title', 'completed', 'created_at', 'priority',
+                 'due_date', 'position', 'tags', 'reminded')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        return {
+            'id': self.id, 'title': self.title, 'completed': self.completed,
+            'created_at': self.created_at, 'priority': self.priority,
+            'dueDate': self.due_date, 'position': self.position,
+            'tags': sorted(self.tags),
+        }
+
+def as_sqlite_bool(value):
+    # Match what SQLite hands back for a Python bool bound to a BOOLEAN column
+    return int(value) if isinstance(value, bool) else value
+
+class MemoryStore(TodoStore, TodoTransaction):
+    """In-process engine for latency-critical single-process deployments.
+
+    Records live in a dict keyed by id; ids are handed out in creation
+    order, so the dict order doubles as the created_at index. Secondary
+    indexes cover tags, priority, completion and manual position, and the
+    whole store is written to `path` as JSON every MEMORY_SNAPSHOT_SECONDS
+    when it has changed. One lock serialises access, so a transaction is
+    just the store itself.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.RLock()
+        self.records = {}
+        self.next_id = 1
+        self.by_tag = {}
+        self.by_priority = {}
+        self.active = set()
+        self.done = set()
+        self.positions = []
+        self.daily_created = Counter()
+        self.daily_completed = Counter()
+        self.due_heap = []
+        self.events = deque(maxlen=MEMORY_MAX_DUE_EVENTS)
+        self.next_event_id = 1
+        self.idempotency = OrderedDict()
+        self.dirty = False
+        if path and os.path.exists(path):
+            self.load()
+
+    @contextmanager
+    def read(self):
+        with self.lock:
+            yield self
+
+    @contextmanager
+    def write(self):
+        with self.lock:
+            yield self
+            self.dirty = True
+
+    def background_loops(self):
+        return [(self.reminder_loop, 'todo-reminders'),
+                (self.snapshot_loop, 'todo-memory-snapshot')]
+
+    # Index maintenance
+
+    def index(self, record):
+        for tag in record.tags:
+            self.by_tag.setdefault(tag, set()).add(record.id)
+        self.by_priority.setdefault(record.priority, set()).add(record.id)
+        (self.done if record.completed else self.active).add(record.id)
+        bisect.insort(self.positions, (record.position, record.id))
+
+    def schedule(self, record):
+        if record.due_date is not None and not record.reminded:
+            heapq.heappush(self.due_heap, (record.due_date, record.id))
+
+    def unindex(self, record):
+        for tag in record.tags:
+            self.by_tag[tag].discard(record.id)
+        self.by_priority[record.priority].discard(record.id)
+        self.active.discard(record.id)
+        self.done.discard(record.id)
+        i = bisect.bisect_left(self.positions, (record.position, record.id))
+        del self.positions[i]
+        # Stale due_heap entries are skipped when popped
+
+    def record(self, todo_id):
+        record = self.records.get(todo_id)
+        if record is None:
+            raise TodoNotFound('Todo not found')
+        return record
+
+    # TodoTransaction
+
+    def list(self, tag=None, priority=None, due_before=None, sort=None):
+        ids = None
+        if tag is not None:
+            ids = set(self.by_tag.get(tag, ()))
+        if priority is not None:
+            matches = self.by_priority.get(priority, set())
+            ids = matches if ids is None else ids & matches
+        if sort == 'position':
+            ordered = (self.records[i] for _, i in self.positions)
+        else:
+            ordered = reversed(self.records.values())
+        return [
+            r.to_dict() for r in ordered
+            if (ids is None or r.id in ids)
+            and (due_before is None or (r.due_date is not None and r.due_date < due_before))
+        ]
+
+    def create(self, data):
+        now = utc_now()
+        record = TodoRecord(
+            id=self.next_id, title=data['title'],
+            completed=as_sqlite_bool(data.get('completed', False)),
+            created_at=now.strftime('%Y-%m-%d %H:%M:%S'),
+            priority=data.get('priority'), due_date=data.get('dueDate'),
+            position=rank_between(None, self.positions[0][0] if self.positions else None),
+            tags=frozenset(data.get('tags') or ()), reminded=False,
+        )
+        self.next_id += 1
+        self.records[record.id] = record
+        self.index(record)
+        self.schedule(record)
+        self.daily_created[record.created_at[:10]] += 1
+        if record.completed:
+            self.daily_completed[record.created_at[:10]] += 1
+        return record.to_dict()
+
+    def update(self, todo_id, data):
+        record = self.record(todo_id)
+        self.unindex(record)
+        was_completed = bool(record.completed)
+        if 'title' in data:
+            record.title = data['title']
+        if 'completed' in data:
+            record.completed = as_sqlite_bool(data['completed'])
+        if 'priority' in data:
+            record.priority = data['priority']
+        if 'tags' in data:
+            record.tags = frozenset(data['tags'] or ())
+        if 'dueDate' in data:
+            # A new deadline gets a fresh reminder; the old heap entry goes stale
+            record.due_date = data['dueDate']
+            record.reminded = False
+            self.schedule(record)
+        self.index(record)
+        if record.completed and not was_completed:
+            self.daily_completed[utc_now().strftime('%Y-%m-%d')] += 1
+        return record.to_dict()
+
+    def delete(self, todo_id):
+        # Nothing to fragment in memory, so deletes are immediate
+        self.unindex(self.record(todo_id))
+        del self.records[todo_id]
+
+    def complete_all(self):
+        ids = sorted(self.active)
+        for todo_id in ids:
+            self.records[todo_id].completed = 1
+        self.done |= self.active
+        self.active = set()
+        if ids:
+            self.daily_completed[utc_now().strftime('%Y-%m-%d')] += len(ids)
+        return ids
+
+    def clear_completed(self):
+        ids = sorted(self.done)
+        for todo_id in ids:
+            record = self.records.pop(todo_id)
+            for tag in record.tags:
+                self.by_tag[tag].discard(todo_id)
+            self.by_priority[record.priority].discard(todo_id)
+        # One pass over the position index instead of one delete per todo
+        self.positions = [p for p in self.positions if p[1] not in self.done]
+        self.done = set()
+        return ids
+
+    def move(self, todo_id, anchor_id, before):
+        record = self.record(todo_id)
+        if anchor_id is not None and (anchor_id == todo_id or anchor_id not in self.records):
+            raise TodoNotFound('Anchor todo not found')
+        self.unindex(record)
+        keys = self.positions
+        if anchor_id is None:
+            i = len(keys) if before else 0
+        else:
+            anchor = self.records[anchor_id]
+            i = bisect.bisect_left(keys, (anchor.position, anchor_id))
+            if not before:
+                i += 1
+        low = keys[i - 1][0] if i > 0 else None
+        high = keys[i][0] if i < len(keys) else None
+        record.position = rank_between(low, high)
+        self.index(record)
+        return record.to_dict()
+
+    def stats(self, days):
+        first = (utc_now() - timedelta(days=max(days - 1, 0))).strftime('%Y-%m-%d')
+        return {
+            'total': len(self.records),
+            'completed': len(self.done),
+            'active': len(self.active),
+            'created_per_day': {d: n for d, n in sorted(self.daily_created.items()) if d >= first},
+            'completed_per_day': {d: n for d, n in sorted(self.daily_completed.items()) if d >= first},
+        }
+
+    def due_events(self, after, limit):
+        return [e for e in self.events if e['id'] > after][:limit]
+
+    def idempotent_get(self, key, since):
+        entry = self.idempotency.get(key)
+        if entry is None or entry[3] <= since:
+            return None
+        self.idempotency.move_to_end(key)
+        return entry[:3]
+
+    def idempotent_put(self, key, request_line, status, body):
+        self.idempotency[key] = (request_line, status, body, time.time())
+        self.idempotency.move_to_end(key)
+        while len(self.idempotency) > MEMORY_MAX_IDEMPOTENCY_KEYS:
+            self.idempotency.popitem(last=False)
+
+    # Background work
+
+    def fire_due_reminders(self, now):
+        """Pop every deadline up to `now` off the heap; O(log n) each."""
+        fired = []
+        with self.lock:
+            while self.due_heap and self.due_heap[0][0] <= now:
+                due_date, todo_id = heapq.heappop(self.due_heap)
+                record = self.records.get(todo_id)
+                if record is None or record.reminded or record.due_date != due_date:
+                    continue
+                record.reminded = True
+                self.dirty = True
+                if record.completed:
+                    continue
+                self.events.append({
+                    'id': self.next_event_id, 'todo_id': todo_id, 'dueDate': due_date,
+                    'fired_at': utc_now().strftime('%Y-%m-%d %H:%M:%S'),
+                })
+                self.next_event_id += 1
+                fired.append((todo_id, due_date))
+            head = self.due_heap[0][0] if self.due_heap else None
+        return fired, head
+
+    def skip_due(self, due_date):
+        """Drop deadlines that don't parse from the heap, marking their todos reminded."""
+        with self.lock:
+            while self.due_heap and self.due_heap[0][0] == due_date:
+                _, todo_id = heapq.heappop(self.due_heap)
+                record = self.records.get(todo_id)
+                if record is not None and record.due_date == due_date:
+                    record.reminded = True
+                    self.dirty = True
+
+    def reminder_loop(self, stop_event):
+        while not stop_event.is_set():
+            reminder_wakeup.clear()
+            fired, head = self.fire_due_reminders(utc_now_iso())
+            for todo_id, due_date in fired:
+                app.logger.info('todo %s is due (%s)', todo_id, due_date)
+            sleep = REMINDER_MAX_SLEEP
+            if head is not None:
+                wait = seconds_until(head)
+                if wait is None:
+                    app.logger.warning('skipping unparseable due date %r', head)
+                    self.skip_due(head)
+                    continue
+                sleep = min(sleep, max(wait, 0.01))
+            reminder_wakeup.wait(sleep)
+
+    def save(self):
+        with self.lock:
+            if len(self.positions) and max(len(p) for p, _ in self.positions) > RANK_REBALANCE_LENGTH:
+                ordered = [self.records[i] for _, i in self.positions]
+                for record, position in zip(ordered, evenly_spaced_ranks(len(ordered))):
+                    record.position = position
+                self.positions = sorted((r.position, r.id) for r in ordered)
+            state = {
+                'next_id': self.next_id,
+                'next_event_id': self.next_event_id,
+                'daily_created': self.daily_created,
+                'daily_completed': self.daily_completed,
+                'todos': [{name: getattr(r, name) for name in TodoRecord.__slots__}
+                          for r in self.records.values()],
+            }
+            for todo in state['todos']:
+                todo['tags'] = sorted(todo['tags'])
+            self.dirty = False
+            data = json.dumps(state)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def load(self):
+        with open(self.path) as f:
+            state = json.load(f)
+        self.next_id = state['next_id']
+        self.next_event_id = state['next_event_id']
+        self.daily_created.update(state['daily_created'])
+        self.daily_completed.update(state['daily_completed'])
+        for fields in state['todos']:
+            record = TodoRecord(**fields)
+            record.tags = frozenset(record.tags)
+            if record.due_date is not None:
+                due_date = canonical_due_date(record.due_date)
+                if due_date is None:
+                    record.reminded = True
+                else:
+                    record.due_date = due_date
+            self.records[record.id] = record
+            self.index(record)
+            self.schedule(record)
+
+    def snapshot_loop(self, stop_event):
+        while True:
+            stopping = stop_event.wait(MEMORY_SNAPSHOT_SECONDS)
+            if self.path and self.dirty:
+                try:
+                    self.save()
+                except OSError as e:
+                    app.logger.warning('memory snapshot failed: %s', e)
+            if stopping:
+                return
+
+app.config['STORE'] = SqliteStore()
 
 @app.route('/api/todos', methods=['GET'])
 def get_todos():
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute('SELECT * FROM todos ORDER BY created_at DESC')
-    todos = [dict(row) for row in cursor.fetchall()]
+    due_before = request.args.get('due_before')
+    if due_before is not None:
+        due_before = canonical_due_date(due_before)
+        if due_before is None:
+            return jsonify({'error': 'due_before must be an ISO date string'}), 400
+    
+    # ?sort=position gives the user's drag-and-drop order
+    with app.config['STORE'].read() as tx:
+        todos = tx.list(
+            tag=request.args.get('tag'),
+            priority=request.args.get('priority'),
+            due_before=due_before,
+            sort=request.args.get('sort'),
+        )
     return jsonify(todos)
 
+def attach_tags(cursor, todos):
+    """Fill in each todo's 'tags' list with one join query per 500 todos."""
+    by_id = {}
+    for todo in todos:
+        todo['tags'] = []
+        by_id[todo['id']] = todo
+    ids = list(by_id)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        cursor.execute(
+            'SELECT todo_tags.todo_id, tags.name FROM todo_tags '
+            'JOIN tags ON tags.id = todo_tags.tag_id '
+            'WHERE todo_tags.todo_id IN (%s) ORDER BY tags.name' % ','.join('?' * len(chunk)),
+            chunk
+        )
+        for todo_id, name in cursor.fetchall():
+            by_id[todo_id]['tags'].append(name)
+    return todos
+
+def set_tags(cursor, todo_id, tags):
+    cursor.execute('DELETE FROM todo_tags WHERE todo_id = ?', (todo_id,))
+    names = sorted(set(tags))
+    cursor.executemany('INSERT OR IGNORE INTO tags (name) VALUES (?)', [(n,) for n in names])
+    cursor.executemany(
+        'INSERT INTO todo_tags (tag_id, todo_id) SELECT id, ? FROM tags WHERE name = ?',
+        [(todo_id, n) for n in names]
+    )
+
+def fetch_todo(cursor, todo_id):
+    cursor.execute('SELECT ' + TODO_COLUMNS + ' FROM todos WHERE id = ?', (todo_id,))
+    return attach_tags(cursor, [dict(cursor.fetchone())])[0]
+
+def canonical_due_date(value):
+    """Canonical UTC text for an ISO-8601 date or datetime, or None if it doesn't parse.
+
+    Dates stay YYYY-MM-DD (midnight UTC). Datetimes are converted to UTC and
+    stored naive as YYYY-MM-DDTHH:MM:SS, like utc_now_iso(), so comparing
+    the text compares the instants for due_before and the reminder index.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        pass
+    try:
+        due = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if due.tzinfo is not None:
+        due = due.astimezone(timezone.utc).replace(tzinfo=None)
+    return due.strftime('%Y-%m-%dT%H:%M:%S')
+
+def validate_fields(data):
+    """Return an error message for malformed rich fields, or None.
+
+    A valid dueDate is rewritten in place to its canonical_due_date() form.
+    """
+    if 'completed' in data and not (
+        type(data['completed']) in (bool, int) and data['completed'] in (0, 1)
+    ):
+        return 'completed must be true or false'
+    if data.get('priority') is not None and data['priority'] not in PRIORITIES:
+        return 'priority must be one of: ' + ', '.join(PRIORITIES)
+    if data.get('dueDate') is not None:
+        due_date = canonical_due_date(data['dueDate'])
+        if due_date is None:
+            return 'dueDate must be an ISO date string'
+        data['dueDate'] = due_date
+    tags = data.get('tags')
+    if tags is not None and not (
+        isinstance(tags, list) and all(isinstance(t, str) and t for t in tags)
+    ):
+        return 'tags must be a list of non-empty strings'
+    return None
+
+def replay_idempotent(tx):
+    """Return the stored response if this Idempotency-Key was already used.
+
+    Must be called inside the write transaction, so two concurrent retries
+    cannot both miss the lookup and both do the write.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        return None
+    stored = tx.idempotent_get(key, time.time() - IDEMPOTENCY_TTL_SECONDS)
+    if stored is None:
+        return None
+    request_line, status, body = stored
+    if request_line != request.method + ' ' + request.path:
+        return jsonify({'error': 'Idempotency-Key was used for a different request'}), 422
+    response = app.response_class(body, status=status, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def remember_idempotent(tx, body, status):
+    """Store a successful response under the request's Idempotency-Key."""
+    response = jsonify(body)
+    key = request.headers.get('Idempotency-Key')
+    if key:
+        tx.idempotent_put(key, request.method + ' ' + request.path, status,
+                          response.get_data(as_text=True))
+    return response, status
+
+@app.route('/api/todos/stats', methods=['GET'])
+def get_stats():
+    days = request.args.get('days', 30, type=int)
+    with app.config['STORE'].read() as tx:
+        return jsonify(tx.stats(days))
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Admission counters for this process (each pre-forked worker has its own)."""
+    with metrics_lock:
+        snapshot = dict(metrics)
+    snapshot['pid'] = os.getpid()
+    return jsonify(snapshot)
+
+def admin_denied():
+    """Error response unless the request carries the X-Admin-Token.
+
+    Admin routes don't exist at all unless TODO_ADMIN_TOKEN is set.
+    """
+    token = app.config.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    sent = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(sent.encode(), token.encode()):
+        return jsonify({'error': 'Forbidden'}), 403
+    return None
+
+@app.route('/api/admin/profiling', methods=['GET', 'PUT'])
+def profiling_settings():
+    denied = admin_denied()
+    if denied:
+        return denied
+    
+    profiler.refresh()
+    if request.method == 'PUT':
+        data = request.json or {}
+        enabled = data.get('enabled', profiler.enabled)
+        sample_rate = data.get('sample_rate', profiler.sample_rate)
+        if not isinstance(enabled, bool):
+            return jsonify({'error': 'enabled must be true or false'}), 400
+        if (isinstance(sample_rate, bool) or not isinstance(sample_rate, (int, float))
+                or not 0 <= sample_rate <= 1):
+            return jsonify({'error': 'sample_rate must be between 0 and 1'}), 400
+        profiler.configure(enabled, float(sample_rate))
+    
+    return jsonify({
+        'enabled': profiler.enabled,
+        'sample_rate': profiler.sample_rate,
+        'buffered': len(profiler.reports),
+        'pid': os.getpid(),
+    })
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def get_profiles():
+    """Buffered reports from every worker, newest first."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    
+    limit = request.args.get('limit', PROFILE_BUFFER_SIZE, type=int)
+    route = request.args.get('route')
+    reports = [r for r in profiler.collect() if route is None or r['route'] == route]
+    return jsonify(reports[:max(limit, 0)])
+
 @app.route('/api/todos', methods=['POST'])
 def add_todo():
     data = request.json
     if not data or 'title' not in data:
         return jsonify({'error': 'Title is required'}), 400
+    error = validate_fields(data)
+    if error:
+        return jsonify({'error': error}), 400
     
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute(
-        'INSERT INTO todos (title, completed) VALUES (?, ?)',
-        (data['title'], data.get('completed', False))
-    )
-    db.commit()
-    
-    # Return the newly created todo
-    todo_id = cursor.lastrowid
-    cursor.execute('SELECT * FROM todos WHERE id = ?', (todo_id,))
-    return jsonify(dict(cursor.fetchone())), 201
+    with app.config['STORE'].write() as tx:
+        replay = replay_idempotent(tx)
+        if replay is not None:
+            return replay
+        
+        # Return the newly created todo
+        response = remember_idempotent(tx, tx.create(data), 201)
+    if data.get('dueDate'):
+        wake_reminders()
+    return response
 
 @app.route('/api/todos/<int:todo_id>', methods=['PUT'])
 def update_todo(todo_id):
     data = request.json
     if not data:
         return jsonify({'error': 'No data provided'}), 400
+    if 'title' in data and not data['title']:
+        return jsonify({'error': 'Title is required'}), 400
+    error = validate_fields(data)
+    if error:
+        return jsonify({'error': error}), 400
     
-    db = get_db()
-    cursor = db.cursor()
-    
-    # Check if todo exists
-    cursor.execute('SELECT * FROM todos WHERE id = ?', (todo_id,))
-    if not cursor.fetchone():
-        return jsonify({'error': 'Todo not found'}), 404
-    
-    # Update the todo
-    cursor.execute(
-        'UPDATE todos SET title = ?, completed = ? WHERE id = ?',
-        (data.get('title'), data.get('completed'), todo_id)
-    )
-    db.commit()
-    
-    # Return the updated todo
-    cursor.execute('SELECT * FROM todos WHERE id = ?', (todo_id,))
-    return jsonify(dict(cursor.fetchone()))
+    # Only the fields present in the request are changed, as in server.js
+    try:
+        with app.config['STORE'].write() as tx:
+            replay = replay_idempotent(tx)
+            if replay is not None:
+                return replay
+            
+            # Return the updated todo
+            response = remember_idempotent(tx, tx.update(todo_id, data), 200)
+    except TodoNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    if 'dueDate' in data:
+        wake_reminders()
+    return response
 
 @app.route('/api/todos/<int:todo_id>', methods=['DELETE'])
 def delete_todo(todo_id):
-    db = get_db()
-    cursor = db.cursor()
+    try:
+        with app.config['STORE'].write() as tx:
+            tx.delete(todo_id)
+    except TodoNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    return '', 204
+
+@app.route('/api/todos/<int:todo_id>/move', methods=['PATCH'])
+def move_todo(todo_id):
+    """Move a todo in the manual order: {"after": id} or {"before": id}.
+
+    {"after": null} moves it to the top and {"before": null} to the bottom.
+    Only the moved row is written.
+    """
+    data = request.json
+    if not data or ('after' in data) == ('before' in data):
+        return jsonify({'error': 'Provide exactly one of "after" or "before"'}), 400
     
-    # Check if todo exists
-    cursor.execute('SELECT * FROM todos WHERE id = ?', (todo_id,))
-    if not cursor.fetchone():
-        return jsonify({'error': 'Todo not found'}), 404
+    try:
+        with app.config['STORE'].write() as tx:
+            todo = tx.move(todo_id, data.get('after', data.get('before')), 'before' in data)
+    except TodoNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    return jsonify(todo)
+
+@app.route('/api/todos/due-events', methods=['GET'])
+def get_due_events():
+    """Reminders fired by the scheduler; poll with ?after=<last seen id>."""
+    after = request.args.get('after', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    with app.config['STORE'].read() as tx:
+        return jsonify(tx.due_events(after, limit))
+
+@app.route('/api/todos/complete-all', methods=['POST'])
+def complete_all_todos():
+    with app.config['STORE'].write() as tx:
+        ids = tx.complete_all()
+    return jsonify({'ids': ids})
+
+@app.route('/api/todos', methods=['DELETE'])
+def clear_completed_todos():
+    if request.args.get('completed') != 'true':
+        return jsonify({'error': 'Only completed=true is supported'}), 400
     
-    cursor.execute('DELETE FROM todos WHERE id = ?', (todo_id,))
-    db.commit()
-    return '', 204
+    with app.config['STORE'].write() as tx:
+        ids = tx.clear_completed()
+    return jsonify({'ids': ids})
+
+def purge_in_batches(db, sql, params):
+    """Repeat a DELETE whose last parameter is the batch LIMIT until it runs dry."""
+    purged = 0
+    while True:
+        with write_transaction(db) as cursor:
+            cursor.execute(sql, params + (PURGE_BATCH_SIZE,))
+            batch = cursor.rowcount
+        purged += batch
+        if batch < PURGE_BATCH_SIZE:
+            return purged
+        time.sleep(0.01)
+
+def run_maintenance(db):
+    """One maintenance pass: purge old tombstones, then tidy the file.
+
+    Purging happens in small transactions so foreground writers only ever
+    wait for one batch; the PRAGMAs use a short busy timeout and are simply
+    retried next pass if the database is busy.
+    """
+    purged = purge_in_batches(
+        db,
+        'DELETE FROM todos WHERE id IN ('
+        '  SELECT id FROM todos WHERE deleted_at IS NOT NULL'
+        '  AND deleted_at < datetime(\'now\', ?) LIMIT ?)',
+        ('-%d seconds' % PURGE_AFTER_SECONDS,)
+    )
+    purge_in_batches(
+        db,
+        'DELETE FROM due_events WHERE id IN ('
+        '  SELECT id FROM due_events WHERE fired_at < datetime(\'now\', ?) LIMIT ?)',
+        ('-%d seconds' % DUE_EVENT_TTL_SECONDS,)
+    )
+    purge_in_batches(
+        db,
+        'DELETE FROM idempotency_keys WHERE key IN ('
+        '  SELECT key FROM idempotency_keys WHERE created_at < ? LIMIT ?)',
+        (time.time() - IDEMPOTENCY_TTL_SECONDS,)
+    )
+
+    # Repeated moves into the same gap grow keys by about one digit each;
+    # once any key gets long, respace them all (rare, one short transaction)
+    longest = db.execute(
+        'SELECT MAX(length(position)) FROM todos WHERE deleted_at IS NULL'
+    ).fetchone()[0]
+    if longest and longest > RANK_REBALANCE_LENGTH:
+        with write_transaction(db) as cursor:
+            rebalance_positions(cursor)
+
+    for pragma in ('incremental_vacuum(%d)' % VACUUM_PAGES,
+                   'optimize',
+                   'wal_checkpoint(TRUNCATE)'):
+        try:
+            db.execute('PRAGMA ' + pragma).fetchall()
+        except sqlite3.OperationalError as e:
+            app.logger.warning('maintenance: PRAGMA %s skipped: %s', pragma, e)
+    return purged
+
+def maintenance_loop(stop_event, interval=MAINTENANCE_INTERVAL):
+    db = connect_db(MAINTENANCE_BUSY_TIMEOUT_MS)
+    try:
+        while not stop_event.wait(interval):
+            try:
+                run_maintenance(db)
+            except sqlite3.Error as e:
+                app.logger.warning('maintenance pass failed: %s', e)
+    finally:
+        db.close()
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def utc_now_iso():
+    return utc_now().strftime('%Y-%m-%dT%H:%M:%S')
+
+def fire_due_reminders(db, now):
+    """Mark every deadline up to `now` as reminded and record a due event.
+
+    Completed todos are marked too, but do not produce an event.
+    """
+    fired = []
+    while True:
+        with write_transaction(db) as cursor:
+            cursor.execute(
+                'UPDATE todos SET reminded_at = CURRENT_TIMESTAMP WHERE id IN ('
+                '  SELECT id FROM todos WHERE deleted_at IS NULL'
+                '  AND due_date IS NOT NULL AND reminded_at IS NULL'
+                '  AND due_date <= ? ORDER BY due_date LIMIT ?) '
+                'RETURNING id, due_date, completed',
+                (now, REMINDER_BATCH_SIZE)
+            )
+            rows = cursor.fetchall()
+            due = [(row['id'], row['due_date']) for row in rows if not row['completed']]
+            cursor.executemany(
+                'INSERT INTO due_events (todo_id, due_date) VALUES (?, ?)', due
+            )
+        fired.extend(due)
+        if len(rows) < REMINDER_BATCH_SIZE:
+            return fired
+
+def next_due_date(db):
+    """(id, due_date) of the earliest pending deadline, or None."""
+    return db.execute(
+        'SELECT id, due_date FROM todos WHERE deleted_at IS NULL '
+        'AND due_date IS NOT NULL AND reminded_at IS NULL '
+        'ORDER BY due_date LIMIT 1'
+    ).fetchone()
+
+def seconds_until(due_date):
+    """Seconds from now until `due_date`, or None if it doesn't parse."""
+    due_date = canonical_due_date(due_date)
+    if due_date is None:
+        return None
+    return (datetime.fromisoformat(due_date) - utc_now()).total_seconds()
+
+def reminder_loop(stop_event):
+    """Sleep until the earliest pending deadline, then fire what is due.
+
+    The next deadline is the head of idx_todos_pending_due, so each wake-up
+    is an O(log n) lookup however many todos are scheduled. Due dates are
+    compared as UTC ISO-8601 strings.
+    """
+    db = connect_db()
+    try:
+        while not stop_event.is_set():
+            reminder_wakeup.clear()
+            wait = None
+            try:
+                for todo_id, due_date in fire_due_reminders(db, utc_now_iso()):
+                    app.logger.info('todo %s is due (%s)', todo_id, due_date)
+                head = next_due_date(db)
+                # Due dates are validated on write, but never spin on one that isn't
+                while head is not None and seconds_until(head['due_date']) is None:
+                    app.logger.warning('skipping unparseable due date %r', head['due_date'])
+                    with write_transaction(db) as cursor:
+                        cursor.execute(
+                            'UPDATE todos SET reminded_at = CURRENT_TIMESTAMP WHERE id = ?',
+                            (head['id'],)
+                        )
+                    head = next_due_date(db)
+                if head is not None:
+                    wait = seconds_until(head['due_date'])
+            except sqlite3.Error as e:
+                app.logger.warning('reminder pass failed: %s', e)
+            sleep = REMINDER_MAX_SLEEP
+            if wait is not None:
+                sleep = min(sleep, max(wait, 0.01))
+            # Woken early by wake_reminders() when a due date changes
+            reminder_wakeup.wait(sleep)
+    finally:
+        db.close()
+
+def wake_reminders():
+    """Make the reminder thread re-read the next deadline after a due date changes.
+
+    Under serve_prefork that thread runs in the parent, not in the worker
+    that handled the write, so workers signal the parent instead.
+    """
+    parent = app.config.get('REMINDER_PID')
+    if parent is None or parent == os.getpid():
+        reminder_wakeup.set()
+        return
+    try:
+        os.kill(parent, signal.SIGUSR1)
+    except ProcessLookupError:
+        pass
+
+def forward_reminder_wakeups():
+    """Route wake_reminders() calls from forked workers to this process."""
+    signal.signal(signal.SIGUSR1, lambda signum, frame: reminder_wakeup.set())
+    app.config['REMINDER_PID'] = os.getpid()
+
+def refresh_snapshot():
+    """Copy the primary into SNAPSHOT with the backup API, then swap it in.
+
+    The file's mtime is set to when the copy started, so every write
+    committed before that time is known to be in it.
+    """
+    taken_at = time.time()
+    tmp = SNAPSHOT + '.tmp'
+    src = connect_db()
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst)
+        # Readers open the copy read-only, so it must not need a -wal/-shm
+        dst.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        dst.close()
+        src.close()
+    os.utime(tmp, (taken_at, taken_at))
+    os.replace(tmp, SNAPSHOT)
+
+def snapshot_loop(stop_event):
+    # Refresh at half the bound so a snapshot is never served past it
+    interval = app.config['SNAPSHOT_STALENESS'] / 2
+    while True:
+        try:
+            refresh_snapshot()
+        except (sqlite3.Error, OSError) as e:
+            app.logger.warning('snapshot refresh failed: %s', e)
+        if stop_event.wait(interval):
+            return
+
+def start_background_workers():
+    """Start the store's background threads; set the returned event to stop them."""
+    stop_event = threading.Event()
+    for target, name in app.config['STORE'].background_loops():
+        threading.Thread(target=target, args=(stop_event,),
+                         name=name, daemon=True).start()
+    return stop_event
+
+def stop_worker(signum, frame):
+    """SIGTERM in a serving process: commit any open async batch, then exit."""
+    write_batch.flush()
+    os._exit(0)
+
+def share_admission_limits(workers):
+    """Give each of `workers` pre-forked processes its share of the admission limits.
+
+    Buckets and slots are per process, so without this each limit would be
+    multiplied by the worker count. A client whose requests cluster on one
+    worker is limited sooner than the configured rate, and every worker
+    keeps at least one read and one write slot.
+    """
+    global rate_limiter, read_slots, write_slots
+    rate_limiter = RateLimiter(rate_limiter.rate / workers, max(rate_limiter.burst / workers, 1),
+                               rate_limiter.max_clients)
+    read_slots = threading.BoundedSemaphore(max(MAX_CONCURRENT_READS // workers, 1))
+    write_slots = threading.BoundedSemaphore(max(MAX_CONCURRENT_WRITES // workers, 1))
+
+def serve_prefork(host, port, workers):
+    """Bind once, then fork `workers` processes that accept on the same socket.
+
+    The kernel spreads incoming connections across the workers, so reads
+    scale with cores; writes are serialised by write_transaction().
+    """
+    from werkzeug.serving import make_server
+
+    app.config['WORKERS'] = workers
+    share_admission_limits(workers)
+    # Before forking, so no worker can signal while SIGUSR1 still kills us
+    forward_reminder_wakeups()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, stop_worker)
+            server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+            server.serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    def stop_children(signum=None, frame=None):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        if signum is not None:
+            raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop_children)
+    # Background threads run once, in the parent, after the workers are forked
+    start_background_workers()
+    print(f' * Serving on http://{host}:{port} with {workers} workers')
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        stop_children()
+    finally:
+        sock.close()
 
 if __name__ == '__main__':
-    # Initialize the database
-    if not os.path.exists(DATABASE):
+    parser = argparse.ArgumentParser(description='Todo API backend')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of pre-forked worker processes (POSIX only)')
+    parser.add_argument('--snapshot-staleness', type=float, default=0, metavar='SECONDS',
+                        help='serve read routes from a snapshot at most this old')
+    parser.add_argument('--access-log', metavar='PATH',
+                        help="write JSON-lines access logs to PATH ('-' for stdout)")
+    parser.add_argument('--access-log-sample', type=float, default=1.0, metavar='RATE',
+                        help='fraction of non-error requests to log')
+    parser.add_argument('--profile-sample', type=float, metavar='RATE',
+                        help='start with the sampling profiler on at this rate')
+    parser.add_argument('--durability', choices=sorted(DURABILITY_PROFILES),
+                        default=DEFAULT_DURABILITY,
+                        help='strict: fsync every write; normal: fsync at checkpoints; '
+                        'async: group commit, up to %gs of writes lost on a crash'
+                        % ASYNC_FLUSH_SECONDS)
+    parser.add_argument('--rate-limit', type=float, default=RATE_LIMIT_PER_SECOND,
+                        metavar='PER_SECOND', help='requests per second per client')
+    parser.add_argument('--store', choices=('sqlite', 'memory'), default='sqlite',
+                        help='storage engine (memory: single process, snapshotted to %s)'
+                        % MEMORY_SNAPSHOT)
+    args = parser.parse_args()
+    if args.store == 'memory' and (args.workers > 1 or args.snapshot_staleness):
+        parser.error('--store memory cannot be combined with --workers or --snapshot-staleness')
+    if args.store == 'memory' and args.durability != DEFAULT_DURABILITY:
+        parser.error('--durability only applies to --store sqlite')
+    if args.durability == 'async' and (args.workers > 1 or args.snapshot_staleness):
+        # Other workers, and the snapshot, only see a batch once it commits
+        parser.error('--durability async cannot be combined with --workers or --snapshot-staleness')
+    if args.rate_limit <= 0:
+        parser.error('--rate-limit must be positive')
+    if args.profile_sample is not None and not 0 <= args.profile_sample <= 1:
+        parser.error('--profile-sample must be between 0 and 1')
+    app.config['SNAPSHOT_STALENESS'] = args.snapshot_staleness
+    app.config['DURABILITY'] = args.durability
+    if args.rate_limit != RATE_LIMIT_PER_SECOND:
+        rate_limiter = RateLimiter(args.rate_limit, max(RATE_LIMIT_BURST, 2 * args.rate_limit),
+                                   RATE_LIMIT_MAX_CLIENTS)
+    if args.access_log:
+        stream = sys.stdout if args.access_log == '-' else open(args.access_log, 'a')
+        app.config['ACCESS_LOG'] = AccessLogSink(stream, args.access_log_sample)
+        # The structured log replaces werkzeug's per-request lines
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    app.config['ADMIN_TOKEN'] = os.environ.get('TODO_ADMIN_TOKEN')
+    profiler.reset()
+    if args.profile_sample:
+        profiler.configure(True, args.profile_sample)
+
+    if args.store == 'memory':
+        app.config['STORE'] = MemoryStore(MEMORY_SNAPSHOT)
+    else:
+        # Initialize the database (idempotent; also switches it to WAL)
         init_db()
     
-    # Run the Flask app
-    app.run(port=5001, debug=True)
+    if args.workers > 1 and hasattr(os, 'fork'):
+        serve_prefork(args.host, args.port, args.workers)
+    else:
+        # With debug=True only the reloader's child actually serves requests
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_background_workers()
+            signal.signal(signal.SIGTERM, stop_worker)
+        # Run the Flask app
+        app.run(host=args.host, port=args.port, debug=True)
@@ -1,14 +1,20 @@
 """
 Pytest Configuration and Fixtures
-Handles WebDriver setup and teardown
+Handles WebDriver setup and teardown, and a fresh Python backend per test
 """
 
+import os
+import sys
 import pytest
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import simple_backend  # noqa: E402
+
 
 @pytest.fixture(scope="function")
 def driver():
@@ -47,6 +53,45 @@ def driver():
     print("✓ Chrome WebDriver closed")
 
 
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """
+    simple_backend on a fresh todos.db in tmp_path, served by a SqliteStore
+    The per-client rate limit is lifted because tests call the API from one
+    address in quick succession; admission tests install their own limiter
+    """
+    database = str(tmp_path / 'todos.db')
+    monkeypatch.setattr(simple_backend, 'DATABASE', database)
+    monkeypatch.setattr(simple_backend, 'WRITE_LOCK', database + '.lock')
+    monkeypatch.setattr(simple_backend, 'SNAPSHOT', database + '.snapshot')
+    monkeypatch.setattr(simple_backend, 'rate_limiter',
+                        simple_backend.RateLimiter(1e9, 1e9, 10))
+    monkeypatch.setattr(simple_backend, 'profiler',
+                        simple_backend.RequestProfiler(database + '.profiling'))
+    monkeypatch.setattr(simple_backend, 'metrics', simple_backend.Counter())
+    for key in ('SNAPSHOT_STALENESS', 'ACCESS_LOG', 'ADMIN_TOKEN', 'DURABILITY'):
+        monkeypatch.delitem(simple_backend.app.config, key, raising=False)
+    simple_backend.init_db()
+    monkeypatch.setitem(simple_backend.app.config, 'STORE', simple_backend.SqliteStore())
+    return simple_backend
+
+
+@pytest.fixture
+def async_durability(backend, monkeypatch):
+    """Switch `backend` to the async (group commit) profile with a fresh WriteBatch"""
+    monkeypatch.setitem(backend.app.config, 'DURABILITY', 'async')
+    batch = backend.WriteBatch()
+    monkeypatch.setattr(backend, 'write_batch', batch)
+    yield batch
+    batch.flush()
+
+
+@pytest.fixture
+def client(backend):
+    """Flask test client for the `backend` fixture"""
+    return backend.app.test_client()
+
+
 @pytest.fixture(scope="session", autouse=True)
 def print_test_header():
     """Print test suite header"""
@@ -72,3 +117,6 @@ def pytest_configure(config):
     config.addinivalue_line(
         "markers", "e2e: mark test as end-to-end test"
     )
+    config.addinivalue_line(
+        "markers", "benchmark: mark test as a throughput benchmark"
+    )
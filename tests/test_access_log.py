@@ -0,0 +1,89 @@
+"""
+Access Log Checks
+JSON-lines entries written by AccessLogSink's background thread, sampling,
+drop-and-count when the queue is full, and X-Request-ID echoing
+"""
+
+import io
+import json
+import os
+import queue
+import time
+
+
+def _wait_for_lines(stream, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        lines = stream.getvalue().splitlines()
+        if len(lines) >= count:
+            return [json.loads(line) for line in lines]
+        time.sleep(0.01)
+    raise AssertionError(f'expected {count} log lines, got {stream.getvalue()!r}')
+
+
+def test_one_json_line_per_request(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, 'ACCESS_LOG_FLUSH_SECONDS', 0.01)
+    stream = io.StringIO()
+    monkeypatch.setitem(backend.app.config, 'ACCESS_LOG', backend.AccessLogSink(stream))
+
+    todo = client.post('/api/todos', json={'title': 'A'}).get_json()
+    client.put(f"/api/todos/{todo['id']}", json={'completed': True},
+               headers={'X-Request-ID': 'trace-42'})
+    client.get('/api/todos/999/nothing')
+
+    created, updated, missing = _wait_for_lines(stream, 3)
+    assert created['method'] == 'POST'
+    assert created['route'] == '/api/todos'
+    assert created['status'] == 201
+    assert created['sql_count'] > 0
+    assert created['pid'] == os.getpid()
+    assert created['latency_ms'] >= 0
+    assert updated['request_id'] == 'trace-42'
+    assert updated['route'] == '/api/todos/<int:todo_id>'
+    assert updated['path'] == f"/api/todos/{todo['id']}"
+    assert (missing['route'], missing['status'], missing['sql_count']) == (None, 404, 0)
+
+
+def test_async_batch_statements_are_counted(backend, client, async_durability, monkeypatch):
+    """Writes, and reads of an open batch, run on the batch connection"""
+    monkeypatch.setattr(backend, 'ACCESS_LOG_FLUSH_SECONDS', 0.01)
+    stream = io.StringIO()
+    monkeypatch.setitem(backend.app.config, 'ACCESS_LOG', backend.AccessLogSink(stream))
+
+    client.post('/api/todos', json={'title': 'A'})
+    assert async_durability.started_at is not None
+    assert [t['title'] for t in client.get('/api/todos').get_json()] == ['A']
+
+    created, listed = _wait_for_lines(stream, 2)
+    assert created['sql_count'] > 0
+    assert listed['sql_count'] > 0
+
+
+def test_request_id_is_echoed_or_generated(client):
+    assert client.get('/api/todos', headers={'X-Request-ID': 'abc'}).headers['X-Request-ID'] == 'abc'
+    generated = client.get('/api/todos').headers['X-Request-ID']
+    assert len(generated) == 32 and set(generated) <= set('0123456789abcdef')
+    assert client.get('/api/todos').headers['X-Request-ID'] != generated
+
+
+def _idle_sink(backend, maxsize, sample_rate=1.0):
+    """A sink whose writer thread is never started, so entries stay queued"""
+    sink = backend.AccessLogSink(io.StringIO(), sample_rate)
+    sink.pid = os.getpid()
+    sink.queue = queue.Queue(maxsize)
+    return sink
+
+
+def test_sampling_keeps_every_error(backend):
+    sink = _idle_sink(backend, 100, sample_rate=0.0)
+    for status in (200, 201, 404, 500, 503):
+        sink.emit({'status': status})
+    assert [sink.queue.get_nowait()['status'] for _ in range(sink.queue.qsize())] == [500, 503]
+
+
+def test_full_queue_drops_and_counts(backend, client):
+    sink = _idle_sink(backend, 2)
+    for _ in range(5):
+        sink.emit({'status': 200})
+    assert sink.queue.qsize() == 2
+    assert client.get('/api/metrics').get_json()['access_log_dropped'] == 3
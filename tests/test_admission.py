@@ -0,0 +1,78 @@
+"""
+Admission Control Checks
+Per-client token buckets answer 429, full read/write slots answer 503,
+both with Retry-After, and /api/metrics counts every decision
+"""
+
+import threading
+
+
+def _metrics(client):
+    return client.get('/api/metrics').get_json()
+
+
+def test_drained_bucket_gets_429(backend, client, monkeypatch):
+    monkeypatch.setattr(backend, 'rate_limiter', backend.RateLimiter(0.5, 2, 10))
+
+    assert client.get('/api/todos').status_code == 200
+    assert client.post('/api/todos', json={'title': 'A'}).status_code == 201
+    limited = client.get('/api/todos')
+    assert limited.status_code == 429
+    assert limited.get_json() == {'error': 'Too many requests'}
+    # One token refills in 2 s at 0.5/s
+    assert limited.headers['Retry-After'] == '2'
+
+    # Another client has its own bucket, and metrics are never limited
+    other = client.get('/api/todos', environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert other.status_code == 200
+    metrics = _metrics(client)
+    assert (metrics['admitted'], metrics['rate_limited']) == (3, 1)
+
+
+def test_least_recently_seen_client_is_evicted(backend):
+    limiter = backend.RateLimiter(0.001, 1, 2)
+    assert limiter.acquire('a') == 0
+    assert limiter.acquire('a') > 0
+    limiter.acquire('b')
+    limiter.acquire('c')  # pushes 'a' out of the table
+    assert list(limiter.buckets) == ['b', 'c']
+    assert limiter.acquire('a') == 0
+
+
+def test_full_slots_get_503(backend, client, monkeypatch):
+    read_slots = threading.BoundedSemaphore(1)
+    write_slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(backend, 'read_slots', read_slots)
+    monkeypatch.setattr(backend, 'write_slots', write_slots)
+
+    # Hold the only read slot: reads are shed, writes still go through
+    read_slots.acquire()
+    busy = client.get('/api/todos')
+    assert busy.status_code == 503
+    assert busy.headers['Retry-After'] == str(backend.OVERLOAD_RETRY_AFTER)
+    assert client.post('/api/todos', json={'title': 'A'}).status_code == 201
+    read_slots.release()
+
+    write_slots.acquire()
+    assert client.post('/api/todos', json={'title': 'B'}).status_code == 503
+    assert client.get('/api/todos').status_code == 200
+    write_slots.release()
+
+    metrics = _metrics(client)
+    assert (metrics['shed_reads'], metrics['shed_writes'], metrics['admitted']) == (1, 1, 2)
+    # Admitted requests gave their slots back
+    assert read_slots.acquire(blocking=False) and write_slots.acquire(blocking=False)
+
+
+def test_limits_are_shared_across_workers(backend, monkeypatch):
+    for name in ('rate_limiter', 'read_slots', 'write_slots'):
+        monkeypatch.setattr(backend, name, getattr(backend, name))
+    monkeypatch.setattr(backend, 'rate_limiter', backend.RateLimiter(20, 40, 10))
+
+    backend.share_admission_limits(8)
+
+    assert (backend.rate_limiter.rate, backend.rate_limiter.burst) == (2.5, 5)
+    reads = [backend.read_slots.acquire(blocking=False) for _ in range(5)]
+    assert reads.count(True) == backend.MAX_CONCURRENT_READS // 8
+    writes = [backend.write_slots.acquire(blocking=False) for _ in range(2)]
+    assert writes == [True, False]
@@ -0,0 +1,168 @@
+"""
+Crash-Recovery Harness
+Runs simple_backend in each durability profile, SIGKILLs the whole server
+in the middle of a write burst, then checks that todos.db recovers intact
+with every acknowledged write (or, under async, every write acknowledged
+before the last group-commit window), plus a fixed-count write benchmark
+per profile
+"""
+
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import pytest
+
+import simple_backend
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'simple_backend.py')
+WRITERS = 4
+CRASH_AFTER_SECONDS = (1.0, 2.0)
+# Scheduling and commit time on top of the async profile's window
+LOSS_WINDOW_SLACK = 0.3
+BENCHMARK_WRITES = 1000
+BENCHMARK_ROUNDS = 3
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _request(url, method='GET', body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=5) as response:
+        return response.status, json.loads(response.read() or 'null')
+
+
+def _start_server(cwd, profile):
+    """Launch a server in its own process group; return (process, base url)
+
+    Two pre-forked workers, except under async, which is single-process
+    """
+    port = _free_port()
+    workers = '1' if profile == 'async' else '2'
+    process = subprocess.Popen(
+        [sys.executable, BACKEND, '--port', str(port), '--workers', workers,
+         '--durability', profile, '--rate-limit', '100000'],
+        cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            _request(url + '/api/todos')
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    os.killpg(process.pid, signal.SIGKILL)
+    pytest.fail('server did not start')
+
+
+def _write_until_stopped(url, writer, stop, acked):
+    n = 0
+    while not stop.is_set():
+        title = f'w{writer}-{n}'
+        n += 1
+        try:
+            status, todo = _request(url + '/api/todos', 'POST', {'title': title, 'tags': ['crash']})
+        except (OSError, http.client.HTTPException):
+            continue
+        if status == 201:
+            acked.append((todo['id'], title, time.monotonic()))
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs pre-forked workers')
+@pytest.mark.parametrize('profile', ['strict', 'normal', 'async'])
+def test_crash_mid_write_recovers(profile, tmp_path):
+    process, url = _start_server(tmp_path, profile)
+    stop = threading.Event()
+    acked = []
+    writers = [threading.Thread(target=_write_until_stopped, args=(url, i, stop, acked))
+               for i in range(WRITERS)]
+    for thread in writers:
+        thread.start()
+
+    # SIGKILL the parent and every worker while the writers are still going
+    time.sleep(random.uniform(*CRASH_AFTER_SECONDS))
+    os.killpg(process.pid, signal.SIGKILL)
+    killed_at = time.monotonic()
+    process.wait()
+    stop.set()
+    for thread in writers:
+        thread.join()
+    assert acked, 'no write was acknowledged before the crash'
+
+    # Recovery: opening the database replays or discards the WAL
+    db = sqlite3.connect(str(tmp_path / 'todos.db'))
+    try:
+        assert db.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+        stored = dict(db.execute('SELECT id, title FROM todos WHERE deleted_at IS NULL'))
+        lost = [(todo_id, title, acked_at) for todo_id, title, acked_at in acked
+                if stored.get(todo_id) != title]
+        if profile == 'async':
+            # Only the uncommitted batch may go, and it is at most one window old
+            window_start = killed_at - simple_backend.ASYNC_FLUSH_SECONDS - LOSS_WINDOW_SLACK
+            assert [write for write in lost if write[2] < window_start] == []
+        else:
+            assert lost == []
+        # Each write's todo row, tag link and stats trigger landed together or not at all
+        untagged = db.execute(
+            'SELECT COUNT(*) FROM todos WHERE id NOT IN (SELECT todo_id FROM todo_tags)'
+        ).fetchone()[0]
+        assert untagged == 0
+        assert db.execute('SELECT total FROM todo_stats').fetchone()[0] == len(stored)
+    finally:
+        db.close()
+
+    # And the server comes back up on the recovered file
+    process, url = _start_server(tmp_path, profile)
+    try:
+        assert len(_request(url + '/api/todos')[1]) == len(stored)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+    print(f"\n💥 {profile}: {len(acked)} acknowledged, {len(stored)} recovered, "
+          f"{len(lost)} lost")
+
+
+@pytest.fixture
+def profile_client(backend, monkeypatch, request):
+    """Test client whose SQLite connections use the `request.param` profile"""
+    if request.param == 'async':
+        request.getfixturevalue('async_durability')
+    else:
+        monkeypatch.setitem(backend.app.config, 'DURABILITY', request.param)
+    return backend.app.test_client()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('profile_client', ['strict', 'normal', 'async'], indirect=True)
+def test_benchmark_write_throughput(profile_client):
+    """Print sequential create throughput per profile: the median of a few fixed-count rounds"""
+    rates = []
+    for _ in range(BENCHMARK_ROUNDS):
+        start = time.perf_counter()
+        for i in range(BENCHMARK_WRITES):
+            response = profile_client.post('/api/todos', json={'title': f'Task {i}', 'tags': ['bench']})
+            assert response.status_code == 201
+        rates.append(BENCHMARK_WRITES / (time.perf_counter() - start))
+    rates.sort()
+
+    profile = simple_backend.app.config['DURABILITY']
+    print(f"\n⏱️  {profile}: {rates[len(rates) // 2]:.0f} creates/s "
+          f"(rounds {', '.join(f'{rate:.0f}' for rate in rates)})")
+    assert len(profile_client.get('/api/todos').get_json()) == BENCHMARK_ROUNDS * BENCHMARK_WRITES
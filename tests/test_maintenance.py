@@ -0,0 +1,46 @@
+"""
+Maintenance Pass Checks
+Soft-deleted todos are purged in batches once they are old enough, their
+tag links cascade, and the stats counters are left untouched
+"""
+
+
+def test_purge_old_tombstones_in_batches(backend, client, monkeypatch):
+    ids = [client.post('/api/todos', json={'title': f'T{i}', 'tags': ['work']}).get_json()['id']
+           for i in range(8)]
+    for todo_id in ids[:6]:
+        assert client.delete(f'/api/todos/{todo_id}').status_code == 204
+    stats = client.get('/api/todos/stats').get_json()
+
+    db = backend.connect_db()
+    # Five tombstones are past PURGE_AFTER_SECONDS; the sixth was deleted just now
+    db.execute(
+        "UPDATE todos SET deleted_at = datetime('now', ?) WHERE id IN (%s)"
+        % ','.join('?' * 5),
+        ('-%d seconds' % (backend.PURGE_AFTER_SECONDS + 60), *ids[:5])
+    )
+
+    transactions = []
+    write_transaction = backend.write_transaction
+
+    def counting_transaction(db=None):
+        transactions.append(db)
+        return write_transaction(db)
+
+    monkeypatch.setattr(backend, 'PURGE_BATCH_SIZE', 2)
+    monkeypatch.setattr(backend, 'write_transaction', counting_transaction)
+    try:
+        assert backend.run_maintenance(db) == 5
+        remaining = [row[0] for row in db.execute('SELECT id FROM todos ORDER BY id')]
+        linked = {row[0] for row in db.execute('SELECT todo_id FROM todo_tags')}
+    finally:
+        db.close()
+
+    # 2 + 2 + 1 todos, plus one pass each over due_events and idempotency_keys
+    assert len(transactions) == 5
+    assert remaining == ids[5:]
+    assert linked == set(ids[5:])
+    assert client.get('/api/todos/stats').get_json() == stats
+    assert stats['total'] == 2
+    assert sorted(t['id'] for t in client.get('/api/todos').get_json()) == ids[6:]
+
@@ -0,0 +1,111 @@
+"""
+Sampling Profiler Checks
+Covers the admin toggle, the report ring buffer and the SQL timings of
+simple_backend's request profiler through Flask's test client
+"""
+
+import os
+import pytest
+
+import simple_backend
+
+ADMIN = {'X-Admin-Token': 'secret'}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(backend, monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'ADMIN_TOKEN', 'secret')
+
+
+def test_admin_routes_need_the_token(client, monkeypatch):
+    assert client.get('/api/admin/profiling').status_code == 403
+    assert client.get('/api/admin/profiles', headers={'X-Admin-Token': 'nope'}).status_code == 403
+    assert client.get('/api/admin/profiling', headers=ADMIN).status_code == 200
+
+    monkeypatch.setitem(simple_backend.app.config, 'ADMIN_TOKEN', None)
+    assert client.get('/api/admin/profiling', headers=ADMIN).status_code == 404
+
+
+def test_nothing_is_profiled_while_off(client):
+    client.post('/api/todos', json={'title': 'Task'})
+    client.get('/api/todos')
+
+    assert client.get('/api/admin/profiles', headers=ADMIN).get_json() == []
+    assert client.put('/api/admin/profiling', json={'sample_rate': 1.5},
+                      headers=ADMIN).status_code == 400
+
+
+def test_sampled_request_report(client):
+    settings = client.put('/api/admin/profiling', json={'enabled': True, 'sample_rate': 1},
+                          headers=ADMIN).get_json()
+    assert settings['enabled'] is True
+    client.post('/api/todos', json={'title': 'Task', 'tags': ['work']})
+    client.get('/api/todos')
+
+    reports = client.get('/api/admin/profiles', headers=ADMIN).get_json()
+    assert [(r['method'], r['route']) for r in reports] == [('GET', '/api/todos'),
+                                                            ('POST', '/api/todos')]
+    report = reports[0]
+    assert report['tree']['function'].endswith('(get_todos)')
+    assert report['hotspots']
+    statements = [t['sql'] for t in report['sql']]
+    assert any(s.startswith('SELECT id, title') for s in statements)
+    assert report['sql_ms'] == pytest.approx(sum(t['ms'] for t in report['sql']), abs=0.01)
+
+    only_posts = client.get('/api/admin/profiles?route=/api/todos&limit=1', headers=ADMIN)
+    assert len(only_posts.get_json()) == 1
+
+
+def test_async_batch_statements_are_timed(client, async_durability):
+    client.put('/api/admin/profiling', json={'enabled': True, 'sample_rate': 1}, headers=ADMIN)
+    client.post('/api/todos', json={'title': 'Task'})
+    assert async_durability.started_at is not None
+    client.get('/api/todos')
+
+    listed, created = client.get('/api/admin/profiles', headers=ADMIN).get_json()
+    assert any(t['sql'].startswith('INSERT INTO todos') for t in created['sql'])
+    assert any(t['sql'].startswith('SELECT id, title') for t in listed['sql'])
+
+
+def test_toggle_reaches_other_workers(client, tmp_path):
+    """Another process sees the switch through the shared state file"""
+    client.put('/api/admin/profiling', json={'enabled': True, 'sample_rate': 0.25},
+               headers=ADMIN)
+    worker = simple_backend.RequestProfiler(str(tmp_path / 'todos.db.profiling'))
+    worker.refresh()
+    assert (worker.enabled, worker.sample_rate) == (True, 0.25)
+
+    worker.reset()
+    simple_backend.profiler.checked_at = 0.0
+    simple_backend.profiler.refresh()
+    assert simple_backend.profiler.enabled is False
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_reports_from_every_worker(client):
+    """Any worker answers with the reports of all of them"""
+    client.put('/api/admin/profiling', json={'enabled': True, 'sample_rate': 1}, headers=ADMIN)
+    pid = os.fork()
+    if pid == 0:
+        client.post('/api/todos', json={'title': 'From the other worker'})
+        os._exit(0)
+    os.waitpid(pid, 0)
+    client.get('/api/todos')
+
+    reports = client.get('/api/admin/profiles', headers=ADMIN).get_json()
+    assert [(r['method'], r['pid']) for r in reports] == [('GET', os.getpid()), ('POST', pid)]
+
+
+def test_report_files_stay_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(simple_backend, 'PROFILE_BUFFER_SIZE', 3)
+    worker = simple_backend.RequestProfiler(str(tmp_path / 'todos.db.profiling'))
+    for n in range(1, 11):
+        report = {'id': n, 'ts': float(n), 'route': '/api/todos'}
+        worker.reports.append(report)
+        worker.save(report)
+        with open(f'{worker.path}.reports.{os.getpid()}') as f:
+            assert len(f.readlines()) <= 6
+
+    assert [r['id'] for r in worker.collect()] == [10, 9, 8]
+    worker.reset()
+    assert worker.collect() == []
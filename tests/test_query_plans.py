@@ -0,0 +1,65 @@
+"""
+Query Plan Checks
+The statements behind bulk and filtered routes keep using their partial
+indexes once ANALYZE statistics exist, as PRAGMA optimize may gather them
+"""
+
+
+def _fill(backend, live):
+    """20k tombstoned todos plus `live` (completed, due_date) rows, then ANALYZE"""
+    db = backend.connect_db()
+    db.executemany(
+        'INSERT INTO todos (title, completed, deleted_at, position) VALUES (?, ?, ?, ?)',
+        [(f'Gone {i}', i % 2, '2025-01-01 00:00:00', 'a') for i in range(20000)]
+    )
+    db.executemany(
+        'INSERT INTO todos (title, completed, due_date, position) VALUES (?, ?, ?, ?)',
+        [(f'Live {i}', completed, due_date, 'a') for i, (completed, due_date) in enumerate(live)]
+    )
+    db.execute('ANALYZE')
+    return db
+
+
+def _plans(backend, db, operation):
+    """EXPLAIN QUERY PLAN of each todos statement `operation` runs in a write transaction"""
+    statements = []
+    db.set_trace_callback(statements.append)
+    with backend.write_transaction(db) as cursor:
+        operation(backend.SqliteTransaction(cursor))
+    db.set_trace_callback(None)
+    return [
+        ' / '.join(row['detail'] for row in db.execute('EXPLAIN QUERY PLAN ' + sql))
+        # The trace repeats a statement for every trigger it fires
+        for sql in dict.fromkeys(statements) if sql.startswith(('UPDATE todos', 'SELECT id, title'))
+    ]
+
+
+def test_due_before_uses_due_date_index(backend):
+    db = _fill(backend, [(0, None)] * 5000 + [(0, '2025-06-01')] * 11)
+    try:
+        assert _plans(backend, db, lambda tx: tx.list(due_before='2025-01-01')) == [
+            'SEARCH todos USING INDEX idx_todos_due_date (due_date>? AND due_date<?) / '
+            'USE TEMP B-TREE FOR ORDER BY'
+        ]
+    finally:
+        db.close()
+
+
+def test_complete_all_uses_active_index(backend):
+    db = _fill(backend, [(1, None)] * 2000 + [(0, None)] * 11)
+    try:
+        assert _plans(backend, db, lambda tx: tx.complete_all()) == [
+            'SCAN todos USING INDEX idx_todos_active'
+        ]
+    finally:
+        db.close()
+
+
+def test_clear_completed_uses_done_index(backend):
+    db = _fill(backend, [(0, None)] * 2000 + [(1, None)] * 11)
+    try:
+        assert _plans(backend, db, lambda tx: tx.clear_completed()) == [
+            'SCAN todos USING INDEX idx_todos_done'
+        ]
+    finally:
+        db.close()
@@ -0,0 +1,98 @@
+"""
+Reminder Scheduler Checks
+Legacy due dates are rewritten in canonical UTC form on start, and a due
+date that doesn't parse is skipped instead of waking the reminder thread
+in a tight loop
+"""
+
+import os
+import signal
+import threading
+import time
+import pytest
+
+
+def _count_passes(backend, monkeypatch, loop, fire_owner, seconds=0.5):
+    """Run `loop` for `seconds` and count its fire_due_reminders passes"""
+    passes = []
+    fire = fire_owner.fire_due_reminders
+
+    def counting_fire(*args):
+        passes.append(1)
+        return fire(*args)
+
+    monkeypatch.setattr(fire_owner, 'fire_due_reminders', counting_fire)
+    stop = threading.Event()
+    thread = threading.Thread(target=loop, args=(stop,), daemon=True)
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    backend.reminder_wakeup.set()
+    thread.join(5)
+    return len(passes)
+
+
+def test_init_db_canonicalizes_legacy_due_dates(backend):
+    db = backend.connect_db()
+    try:
+        db.executemany(
+            'INSERT INTO todos (title, due_date, position) VALUES (?, ?, ?)',
+            [('offset', '2026-10-19T23:59:00+05:00', 'a'),
+             ('spaced', '2025-01-01 08:00:00', 'b'),
+             ('junk', 'soon', 'c')]
+        )
+        backend.init_db()
+        rows = {row['title']: (row['due_date'], row['reminded_at'])
+                for row in db.execute('SELECT title, due_date, reminded_at FROM todos')}
+    finally:
+        db.close()
+
+    assert rows['offset'] == ('2026-10-19T18:59:00', None)
+    assert rows['spaced'] == ('2025-01-01T08:00:00', None)
+    assert rows['junk'][0] == 'soon' and rows['junk'][1] is not None
+
+
+def test_sqlite_loop_skips_unparseable_due_date(backend, monkeypatch):
+    db = backend.connect_db()
+    try:
+        db.execute("INSERT INTO todos (title, due_date, position) VALUES ('junk', 'soon', 'a')")
+        passes = _count_passes(backend, monkeypatch, backend.reminder_loop, backend)
+        reminded = db.execute('SELECT reminded_at FROM todos').fetchone()[0]
+    finally:
+        db.close()
+
+    # Before the fix this was about 100 passes a second
+    assert passes <= 2
+    assert reminded is not None
+
+
+def test_memory_loop_skips_unparseable_due_date(backend, monkeypatch, tmp_path):
+    store = backend.MemoryStore(str(tmp_path / 'todos.memory.json'))
+    with store.write() as tx:
+        junk = tx.create({'title': 'junk'})
+    # Bypass validation, as a hand-edited snapshot would
+    store.records[junk['id']].due_date = 'soon'
+    store.schedule(store.records[junk['id']])
+
+    passes = _count_passes(backend, monkeypatch, store.reminder_loop, store)
+
+    assert passes <= 2
+    assert store.records[junk['id']].reminded
+    assert store.due_heap == []
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_worker_wakes_parent_reminder_thread(backend, monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'REMINDER_PID', None)
+    previous = signal.getsignal(signal.SIGUSR1)
+    try:
+        backend.forward_reminder_wakeups()
+        backend.reminder_wakeup.clear()
+        pid = os.fork()
+        if pid == 0:
+            backend.wake_reminders()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert backend.reminder_wakeup.wait(2)
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
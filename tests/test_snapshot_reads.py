@@ -0,0 +1,66 @@
+"""
+Snapshot Read Checks
+With SNAPSHOT_STALENESS set, read routes use the refreshed snapshot unless
+it is missing, older than the bound, or older than the client's last write
+"""
+
+import os
+import time
+import pytest
+
+
+@pytest.fixture
+def snapshot_client(backend, client, monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'SNAPSHOT_STALENESS', 10)
+    return client
+
+
+def _titles(response):
+    return sorted(t['title'] for t in response.get_json())
+
+
+def _metrics(client):
+    return client.get('/api/metrics').get_json()
+
+
+def test_missing_snapshot_reads_primary(snapshot_client):
+    snapshot_client.post('/api/todos', json={'title': 'A'})
+    assert _titles(snapshot_client.get('/api/todos')) == ['A']
+    assert 'snapshot_reads' not in _metrics(snapshot_client)
+
+
+def test_snapshot_read_may_be_stale(backend, snapshot_client):
+    snapshot_client.post('/api/todos', json={'title': 'A'})
+    backend.refresh_snapshot()
+    write = snapshot_client.post('/api/todos', json={'title': 'B'})
+
+    # Within the bound the snapshot is served even though it lacks B
+    assert _titles(snapshot_client.get('/api/todos')) == ['A']
+    assert snapshot_client.get('/api/todos/stats').get_json()['total'] == 1
+
+    # Sending back the write's timestamp forces a read that includes it
+    after = {'X-Read-After': write.headers['X-Write-Timestamp']}
+    assert _titles(snapshot_client.get('/api/todos', headers=after)) == ['A', 'B']
+    metrics = _metrics(snapshot_client)
+    assert (metrics['snapshot_reads'], metrics['snapshot_misses']) == (2, 1)
+
+
+def test_read_after_is_served_by_a_newer_snapshot(backend, snapshot_client):
+    write = snapshot_client.post('/api/todos', json={'title': 'A'})
+    time.sleep(0.01)
+    backend.refresh_snapshot()
+
+    after = {'X-Read-After': write.headers['X-Write-Timestamp']}
+    assert _titles(snapshot_client.get('/api/todos', headers=after)) == ['A']
+    assert _metrics(snapshot_client)['snapshot_reads'] == 1
+
+
+def test_snapshot_past_the_bound_is_not_served(backend, snapshot_client):
+    backend.refresh_snapshot()
+    snapshot_client.post('/api/todos', json={'title': 'A'})
+    assert _titles(snapshot_client.get('/api/todos')) == []
+
+    taken_at = time.time() - 11
+    os.utime(backend.SNAPSHOT, (taken_at, taken_at))
+    assert _titles(snapshot_client.get('/api/todos')) == ['A']
+    assert _metrics(snapshot_client)['snapshot_misses'] == 1
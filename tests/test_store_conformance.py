@@ -0,0 +1,243 @@
+"""
+Storage Engine Conformance Suite
+Runs the same API-level checks against every simple_backend storage engine
+(SQLite and in-memory) through Flask's test client, plus a small benchmark
+"""
+
+import time
+import pytest
+
+import simple_backend
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def client(request, backend, tmp_path, monkeypatch):
+    """Flask test client backed by a fresh store of each engine"""
+    if request.param == 'memory':
+        store = backend.MemoryStore(str(tmp_path / 'todos.memory.json'))
+        monkeypatch.setitem(backend.app.config, 'STORE', store)
+    return backend.app.test_client()
+
+
+def _add(client, title, **fields):
+    response = client.post('/api/todos', json={'title': title, **fields})
+    assert response.status_code == 201
+    return response.get_json()
+
+
+class TestStoreConformance:
+    """Behaviour every engine must share"""
+
+    def test_create_and_list(self, client):
+        first = _add(client, 'First', priority='high', dueDate='2025-10-30', tags=['work', 'a'])
+        second = _add(client, 'Second')
+
+        assert first['title'] == 'First'
+        assert first['completed'] == 0
+        assert first['priority'] == 'high'
+        assert first['dueDate'] == '2025-10-30'
+        assert first['tags'] == ['a', 'work']
+        assert second['tags'] == []
+
+        todos = client.get('/api/todos').get_json()
+        assert [t['id'] for t in todos] == [second['id'], first['id']]
+
+    def test_update_changes_only_given_fields(self, client):
+        todo = _add(client, 'Task', priority='low', tags=['x'])
+
+        updated = client.put(f"/api/todos/{todo['id']}", json={'completed': True}).get_json()
+        assert updated['completed'] == 1
+        assert updated['title'] == 'Task'
+        assert updated['priority'] == 'low'
+        assert updated['tags'] == ['x']
+
+        updated = client.put(f"/api/todos/{todo['id']}", json={'tags': ['y', 'z']}).get_json()
+        assert updated['tags'] == ['y', 'z']
+
+    def test_missing_todo_is_404(self, client):
+        assert client.put('/api/todos/999', json={'title': 'x'}).status_code == 404
+        assert client.delete('/api/todos/999').status_code == 404
+        assert client.patch('/api/todos/999/move', json={'after': None}).status_code == 404
+
+    def test_delete_hides_todo(self, client):
+        todo = _add(client, 'Gone')
+        assert client.delete(f"/api/todos/{todo['id']}").status_code == 204
+        assert client.get('/api/todos').get_json() == []
+        assert client.delete(f"/api/todos/{todo['id']}").status_code == 404
+
+    def test_filters(self, client):
+        a = _add(client, 'A', priority='high', dueDate='2025-01-01', tags=['work'])
+        b = _add(client, 'B', priority='low', dueDate='2025-06-01', tags=['home'])
+        c = _add(client, 'C', priority='high', tags=['work', 'home'])
+
+        def ids(query):
+            return sorted(t['id'] for t in client.get('/api/todos?' + query).get_json())
+
+        assert ids('tag=work') == [a['id'], c['id']]
+        assert ids('priority=high') == [a['id'], c['id']]
+        assert ids('tag=home&priority=low') == [b['id']]
+        assert ids('due_before=2025-03-01') == [a['id']]
+        assert ids('tag=missing') == []
+
+    def test_due_dates_are_stored_as_utc(self, client):
+        late = _add(client, 'Late', dueDate='2025-06-01T23:30:00-02:00')
+        early = _add(client, 'Early', dueDate='2025-06-01T12:00:00Z')
+        day = _add(client, 'Day', dueDate='2025-06-01')
+
+        assert late['dueDate'] == '2025-06-02T01:30:00'
+        assert early['dueDate'] == '2025-06-01T12:00:00'
+        assert day['dueDate'] == '2025-06-01'
+
+        def ids(due_before):
+            todos = client.get('/api/todos', query_string={'due_before': due_before})
+            return sorted(t['id'] for t in todos.get_json())
+
+        assert ids('2025-06-02T00:00:00+00:00') == [early['id'], day['id']]
+        assert ids('2025-06-02T01:00:00+01:00') == [early['id'], day['id']]
+        assert ids('2025-06-02T04:00:00+02:00') == [late['id'], early['id'], day['id']]
+
+        assert client.post('/api/todos', json={'title': 'X', 'dueDate': 'soon'}).status_code == 400
+        assert client.put(f"/api/todos/{day['id']}", json={'dueDate': '2025-13-01'}).status_code == 400
+        assert client.get('/api/todos?due_before=tomorrow').status_code == 400
+
+    def test_bulk_operations_and_stats(self, client):
+        a = _add(client, 'A')
+        b = _add(client, 'B', completed=True)
+        c = _add(client, 'C')
+
+        stats = client.get('/api/todos/stats').get_json()
+        assert (stats['total'], stats['completed'], stats['active']) == (3, 1, 2)
+        assert sum(stats['created_per_day'].values()) == 3
+
+        completed = client.post('/api/todos/complete-all').get_json()['ids']
+        assert sorted(completed) == [a['id'], c['id']]
+
+        cleared = client.delete('/api/todos?completed=true').get_json()['ids']
+        assert sorted(cleared) == [a['id'], b['id'], c['id']]
+
+        stats = client.get('/api/todos/stats').get_json()
+        assert (stats['total'], stats['completed'], stats['active']) == (0, 0, 0)
+        assert client.delete('/api/todos').status_code == 400
+
+    def test_completed_must_be_boolean(self, client):
+        todo = _add(client, 'Task', completed=1)
+        assert todo['completed'] == 1
+        for value in ('yes', 2, 'false', None):
+            assert client.post('/api/todos', json={'title': 'X', 'completed': value}).status_code == 400
+            assert client.put(f"/api/todos/{todo['id']}", json={'completed': value}).status_code == 400
+        assert len(client.get('/api/todos').get_json()) == 1
+
+    def test_move(self, client):
+        a, b, c = (_add(client, t)['id'] for t in 'ABC')
+
+        def order():
+            return [t['id'] for t in client.get('/api/todos?sort=position').get_json()]
+
+        assert order() == [c, b, a]
+        client.patch(f'/api/todos/{c}/move', json={'before': None})
+        assert order() == [b, a, c]
+        client.patch(f'/api/todos/{b}/move', json={'after': a})
+        assert order() == [a, b, c]
+        client.patch(f'/api/todos/{c}/move', json={'before': b})
+        assert order() == [a, c, b]
+        assert client.patch(f'/api/todos/{a}/move', json={'after': a}).status_code == 404
+        assert client.patch(f'/api/todos/{a}/move', json={}).status_code == 400
+
+    def test_idempotency_key_replays(self, client):
+        headers = {'Idempotency-Key': 'retry-1'}
+        first = client.post('/api/todos', json={'title': 'Once'}, headers=headers)
+        again = client.post('/api/todos', json={'title': 'Once'}, headers=headers)
+
+        assert again.status_code == 201
+        assert again.headers['Idempotent-Replayed'] == 'true'
+        assert again.get_json() == first.get_json()
+        assert len(client.get('/api/todos').get_json()) == 1
+        assert client.put('/api/todos/1', json={'title': 'x'}, headers=headers).status_code == 422
+
+    def test_due_reminders(self, client):
+        store = simple_backend.app.config['STORE']
+        todo = _add(client, 'Late', dueDate='2020-01-01')
+        _add(client, 'Done', dueDate='2020-01-01', completed=True)
+
+        if isinstance(store, simple_backend.MemoryStore):
+            store.fire_due_reminders(simple_backend.utc_now_iso())
+        else:
+            db = simple_backend.connect_db()
+            simple_backend.fire_due_reminders(db, simple_backend.utc_now_iso())
+            db.close()
+
+        events = client.get('/api/todos/due-events').get_json()
+        assert [(e['todo_id'], e['dueDate']) for e in events] == [(todo['id'], '2020-01-01')]
+
+
+def test_memory_store_snapshot_round_trip(tmp_path):
+    """The in-memory engine restores its todos and indexes from disk"""
+    path = str(tmp_path / 'todos.memory.json')
+    store = simple_backend.MemoryStore(path)
+    with store.write() as tx:
+        first = tx.create({'title': 'Keep', 'tags': ['work'], 'priority': 'high'})
+        tx.create({'title': 'Done', 'completed': True})
+    store.save()
+
+    restored = simple_backend.MemoryStore(path)
+    with restored.read() as tx:
+        assert [t['title'] for t in tx.list()] == ['Done', 'Keep']
+        assert [t['id'] for t in tx.list(tag='work', priority='high')] == [first['id']]
+        assert tx.stats(30)['completed'] == 1
+        assert tx.create({'title': 'Next'})['id'] == 3
+
+
+def test_bulk_operations_agree_with_stats_on_legacy_values(backend):
+    """Rows written before completed was validated count as completed wherever it is nonzero"""
+    client = backend.app.test_client()
+    db = backend.connect_db()
+    try:
+        db.executemany(
+            'INSERT INTO todos (title, completed, position) VALUES (?, ?, ?)',
+            [('yes', 'yes', 'a'), ('two', 2, 'b'), ('false', 'false', 'c'), ('null', None, 'd')]
+        )
+    finally:
+        db.close()
+
+    assert client.get('/api/todos/stats').get_json()['completed'] == 3
+    assert len(client.post('/api/todos/complete-all').get_json()['ids']) == 1
+    assert len(client.delete('/api/todos?completed=true').get_json()['ids']) == 4
+    assert client.get('/api/todos/stats').get_json()['total'] == 0
+
+
+@pytest.mark.benchmark
+def test_benchmark_engines(client):
+    """Print create/list/update throughput for each engine"""
+    count = 300
+    start = time.perf_counter()
+    for i in range(count):
+        _add(client, f'Task {i}', tags=['bench'])
+    created = time.perf_counter()
+    for _ in range(20):
+        assert len(client.get('/api/todos?tag=bench').get_json()) == count
+    listed = time.perf_counter()
+    for i in range(1, count + 1):
+        client.put(f'/api/todos/{i}', json={'completed': True})
+    updated = time.perf_counter()
+
+    engine = type(simple_backend.app.config['STORE']).__name__
+    print(f"\n⏱️  {engine}: "
+          f"{count / (created - start):.0f} creates/s, "
+          f"{20 / (listed - created):.1f} lists of {count}/s, "
+          f"{count / (updated - listed):.0f} updates/s")
+
+
+def test_incomplete_engine_fails_at_construction():
+    """An engine missing an operation can't be built, rather than failing on first use"""
+    class PartialStore(simple_backend.TodoStore, simple_backend.TodoTransaction):
+        def read(self):
+            return self
+
+        def write(self):
+            return self
+
+        def list(self, tag=None, priority=None, due_before=None, sort=None):
+            return []
+
+    with pytest.raises(TypeError, match='abstract'):
+        PartialStore()